@@ -0,0 +1,41 @@
+# gunicorn nustatymai, kuriuos gunicorn paima automatiškai, kai paleidžiamas iš šio katalogo.
+# Programa užkraunama vieną kartą pagrindiniame procese ir pašildoma, o darbuotojai ją paveldi per fork().
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+warmup = os.environ.get('DJANGO_WARMUP', '1') == '1'
+
+
+def when_ready(server):
+    # metrikos skaičiuojamos nuo nulio kiekvieną kartą paleidus serverį, prieš sukuriant darbuotojus
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ptu12_library.settings')
+    from django.conf import settings
+    if settings.METRICS_ENABLED:
+        from ptu12_library.metrics import clear_directory
+        clear_directory()
+        # child_exit katalogą gauna iš aplinkos, ne iš Django nustatymų, o darbuotojai paveldi tą patį
+        os.environ['DJANGO_METRICS_DIR'] = str(settings.METRICS_DIR)
+    # pagrindinis procesas: šablonai, URL, vertimai ir TinyMCE, be duomenų bazės
+    if preload_app and warmup:
+        from ptu12_library.warmup import warm_up
+        timings = warm_up(database=False)
+        server.log.info('Warmed up in %.0f ms: %s', sum(timings.values()) * 1000,
+                        ', '.join('%s %.0f ms' % (step, seconds * 1000) for step, seconds in timings.items()))
+
+
+def post_worker_init(worker):
+    # kiekvienas darbuotojas prieš priimdamas užklausas atsidaro savo DB prisijungimą;
+    # su preload_app likusią programos dalį jau pašildė pagrindinis procesas
+    if warmup:
+        from ptu12_library.warmup import warm_up
+        timings = warm_up(application=not preload_app)
+        worker.log.info('Worker %s warmed up in %.0f ms', worker.pid, sum(timings.values()) * 1000)
+
+
+def child_exit(server, worker):
+    # išėjusio darbuotojo metrikos perkeliamos į bendrą archyvą, kad skaitikliai nesumažėtų
+    if os.environ.get('DJANGO_METRICS') == '1':
+        from ptu12_library.metrics import mark_process_dead
+        mark_process_dead(os.environ['DJANGO_METRICS_DIR'], worker.pid)
@@ -11,7 +11,7 @@ class BookInstanceInline(admin.TabularInline):
 
 
 class BookAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'display_genre')
+    list_display = ('title', 'author', 'display_genre', 'available_count', 'copies_count')
     list_filter = ('genre', )
     inlines = (BookInstanceInline, )
 
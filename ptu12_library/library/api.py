@@ -0,0 +1,187 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
+from django.db.models.query import QuerySet
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+from . models import Author, Book, BookInstance, BookReview, Genre
+from . pagination import KeysetPaginator
+from . templatetags.library_tags import querystring
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+@dataclass
+class ApiField:
+    get: Callable[[Any], Any]
+    select: Tuple[str, ...] = ()
+    prefetch: Tuple[Any, ...] = ()
+
+
+def copy_data(copy: BookInstance) -> Dict[str, Any]:
+    return {
+        'id': str(copy.pk),
+        'status': copy.status,
+        'status_display': str(copy.get_status_display()),
+        'due_back': copy.due_back,
+    }
+
+
+def review_data(review: BookReview) -> Dict[str, Any]:
+    return {
+        'id': review.pk,
+        'reviewer': review.reviewer.get_username() if review.reviewer else None,
+        'reviewed_at': review.reviewed_at,
+        'content': review.content,
+    }
+
+
+BOOK_FIELDS = {
+    'id': ApiField(lambda book: book.pk),
+    'title': ApiField(lambda book: book.title),
+    'summary': ApiField(lambda book: book.summary),
+    'author': ApiField(
+        lambda book: {'id': book.author.pk, 'name': str(book.author)},
+        select=('author',),
+    ),
+    'genres': ApiField(
+        lambda book: [genre.name for genre in book.genre.all()],
+        prefetch=('genre',),
+    ),
+    'cover': ApiField(lambda book: book.cover.url if book.cover else None),
+    'available_count': ApiField(lambda book: book.available_count),
+    'copies_count': ApiField(lambda book: book.copies_count),
+    'copies': ApiField(
+        lambda book: [copy_data(copy) for copy in book.instances.all()],
+        prefetch=('instances',),
+    ),
+    'reviews': ApiField(
+        lambda book: [review_data(review) for review in book.reviews.all()],
+        prefetch=(Prefetch('reviews', queryset=BookReview.objects.select_related('reviewer')),),
+    ),
+}
+
+AUTHOR_FIELDS = {
+    'id': ApiField(lambda author: author.pk),
+    'first_name': ApiField(lambda author: author.first_name),
+    'last_name': ApiField(lambda author: author.last_name),
+    'biography': ApiField(lambda author: author.biography),
+    'books': ApiField(
+        lambda author: [{'id': book.pk, 'title': book.title} for book in author.books.all()],
+        prefetch=(Prefetch('books', queryset=Book.objects.only('id', 'title', 'author_id')),),
+    ),
+}
+
+GENRE_FIELDS = {
+    'id': ApiField(lambda genre: genre.pk),
+    'name': ApiField(lambda genre: genre.name),
+}
+
+COPY_FIELDS = {
+    'id': ApiField(lambda copy: str(copy.pk)),
+    'book': ApiField(lambda copy: {'id': copy.book.pk, 'title': copy.book.title}, select=('book',)),
+    'status': ApiField(lambda copy: copy.status),
+    'status_display': ApiField(lambda copy: str(copy.get_status_display())),
+    'due_back': ApiField(lambda copy: copy.due_back),
+}
+
+REVIEW_FIELDS = {
+    'id': ApiField(lambda review: review.pk),
+    'book': ApiField(lambda review: review.book_id),
+    'reviewer': ApiField(
+        lambda review: review.reviewer.get_username() if review.reviewer else None,
+        select=('reviewer',),
+    ),
+    'reviewed_at': ApiField(lambda review: review.reviewed_at),
+    'content': ApiField(lambda review: review.content),
+}
+
+# resource name -> (queryset, fields, fields left out unless asked for)
+RESOURCES = {
+    'books': (Book.objects.defer('search_document'), BOOK_FIELDS, ('summary', 'copies', 'reviews')),
+    'authors': (Author.objects.defer('search_name'), AUTHOR_FIELDS, ('biography',)),
+    'genres': (Genre.objects.order_by('name'), GENRE_FIELDS, ()),
+    'copies': (BookInstance.objects.all(), COPY_FIELDS, ()),
+    'reviews': (BookReview.objects.all(), REVIEW_FIELDS, ()),
+}
+
+
+class ApiError(Exception):
+    pass
+
+
+def requested_fields(request, fields: Dict[str, ApiField], hidden: Tuple[str, ...]) -> List[str]:
+    """Sparse fieldsets: `?fields=id,title` picks fields, the default is all but the heavy ones."""
+    param = request.GET.get('fields')
+    if not param:
+        return [name for name in fields if name not in hidden]
+    names = [name.strip() for name in param.split(',') if name.strip()]
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    return names
+
+
+def prepare(qs: QuerySet, fields: Dict[str, ApiField], names: List[str]) -> QuerySet:
+    select = [related for name in names for related in fields[name].select]
+    prefetch = [lookup for name in names for lookup in fields[name].prefetch]
+    if select:
+        qs = qs.select_related(*select)
+    if prefetch:
+        qs = qs.prefetch_related(*prefetch)
+    return qs
+
+
+def serialize(obj: Any, fields: Dict[str, ApiField], names: List[str]) -> Dict[str, Any]:
+    return {name: fields[name].get(obj) for name in names}
+
+
+def error(message: str, status: int = 400) -> JsonResponse:
+    return JsonResponse({'error': message}, status=status)
+
+
+def filter_resource(request, resource: str, qs: QuerySet) -> QuerySet:
+    if resource in ('copies', 'reviews') and request.GET.get('book'):
+        qs = qs.filter(book_id=request.GET['book'])
+    if resource == 'books' and request.GET.get('available'):
+        qs = qs.filter(available_count__gt=0)
+    return qs
+
+
+@require_GET
+def resource_list(request, resource: str):
+    if resource not in RESOURCES:
+        raise Http404
+    qs, fields, hidden = RESOURCES[resource]
+    try:
+        names = requested_fields(request, fields, hidden)
+        limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        qs = filter_resource(request, resource, qs.all())
+    except (ApiError, ValueError, ValidationError) as e:
+        return error(str(e))
+    page = KeysetPaginator(prepare(qs, fields, names), max(limit, 1)).get_page(request.GET.get('cursor'))
+    context = {'request': request}
+    return JsonResponse({
+        'results': [serialize(obj, fields, names) for obj in page],
+        'next': request.build_absolute_uri(querystring(context, cursor=page.next_cursor)) if page.has_next() else None,
+        'previous': request.build_absolute_uri(querystring(context, cursor=page.previous_cursor)) if page.has_previous() else None,
+    })
+
+
+@require_GET
+def resource_detail(request, resource: str, pk: str):
+    if resource not in RESOURCES:
+        raise Http404
+    qs, fields, hidden = RESOURCES[resource]
+    try:
+        names = requested_fields(request, fields, ())
+    except ApiError as e:
+        return error(str(e))
+    try:
+        obj = get_object_or_404(prepare(qs.all(), fields, names), pk=pk)
+    except (ValueError, ValidationError):
+        raise Http404
+    return JsonResponse(serialize(obj, fields, names))
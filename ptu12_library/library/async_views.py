@@ -0,0 +1,107 @@
+from typing import Any, Dict
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.http import Http404
+from django.shortcuts import render
+from . import counters, visits
+from . forms import BookReviewForm
+from . models import Author, Book
+from . pagination import KeysetPaginator, keyset_count_mode, keyset_enabled
+from . search import search_authors
+from . views import (
+    BookDetailView, author_detail_queryset, book_detail_queryset, book_list_queryset, review_page_context,
+)
+
+
+async def arender(request, template_name: str, context: Dict[str, Any]):
+    # templates may still touch the session, request.user or a lazy paginator count
+    return await sync_to_async(render)(request, template_name, context)
+
+
+def offset_page(qs, per_page: int, number):
+    page = Paginator(qs, per_page).get_page(number)
+    page.object_list = list(page.object_list)
+    return page
+
+
+async def index(request):
+    counts = await counters.aget_counters()
+    # falls back to the session, which may need loading
+    num_visits = await sync_to_async(visits.read_visits)(request)
+    response = await arender(request, 'library/index.html', {
+        'num_books': counts['books'],
+        'num_instances': counts['instances'],
+        'num_instances_available': counts['instances_available'],
+        'num_authors': counts['authors'],
+        'num_visits': num_visits,
+    })
+    visits.remember_visits(response, num_visits + 1)
+    return response
+
+
+async def author_list(request):
+    query = request.GET.get('query')
+    if query:
+        # the trigram check may run a query of its own
+        qs = await sync_to_async(search_authors)(Author.objects.all(), query)
+        page = await sync_to_async(offset_page)(qs, 5, request.GET.get('page'))
+    elif keyset_enabled(request):
+        paginator = KeysetPaginator(Author.objects.all(), 5, count=keyset_count_mode())
+        page = await paginator.aget_page(request.GET.get('cursor'))
+    else:
+        page = await sync_to_async(offset_page)(Author.objects.all(), 5, request.GET.get('page'))
+    return await arender(request, 'library/authors.html', {
+        'author_list': page,
+    })
+
+
+async def author_detail(request, pk: int):
+    try:
+        author = await author_detail_queryset().aget(pk=pk)
+    except Author.DoesNotExist:
+        raise Http404
+    return await arender(request, 'library/author_detail.html', {
+        'author': author,
+    })
+
+
+async def book_list(request):
+    query = request.GET.get('query')
+    if query:
+        qs = await sync_to_async(book_list_queryset)(request.GET)
+        page = await sync_to_async(offset_page)(qs, 6, request.GET.get('page'))
+    elif keyset_enabled(request):
+        paginator = KeysetPaginator(book_list_queryset(request.GET), 6, count=keyset_count_mode())
+        page = await paginator.aget_page(request.GET.get('cursor'))
+    else:
+        page = await sync_to_async(offset_page)(book_list_queryset(request.GET), 6, request.GET.get('page'))
+    return await arender(request, 'library/book_list.html', {
+        'book_list': page.object_list,
+        'object_list': page.object_list,
+        'page_obj': page,
+        'paginator': page.paginator,
+        'is_paginated': page.has_other_pages(),
+    })
+
+
+book_detail_post = sync_to_async(BookDetailView.as_view())
+
+
+async def book_detail(request, pk: int):
+    if request.method != 'GET':
+        # posting a review stays on the sync view: form validation, messages and redirects
+        return await book_detail_post(request, pk=pk)
+    try:
+        book = await book_detail_queryset().aget(pk=pk)
+    except Book.DoesNotExist:
+        raise Http404
+
+    def render_detail():
+        form = BookReviewForm(initial={'book': book, 'reviewer': request.user})
+        return render(request, 'library/book_detail.html', {
+            'book': book,
+            'object': book,
+            'form': form,
+            **review_page_context(request, book.pk),
+        })
+    return await sync_to_async(render_detail)()
@@ -0,0 +1,54 @@
+import re
+from pathlib import Path
+from typing import Iterator, List
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.checks import Error, Tags, register
+
+# src="/static/...", href="{{ STATIC_URL }}...", url('/static/...') bypass the manifest and are never hashed
+HARDCODED_STATIC = re.compile(
+    r'''(?:(?:src|href|srcset|poster|data)\s*=\s*["']|url\(\s*["']?)\s*(?:/?static/|\{\{\s*STATIC_URL)''',
+    re.IGNORECASE,
+)
+STATIC_TAG = re.compile(r'''\{%\s*static\s+(["'])(?P<name>[^"']+)\1''')
+
+
+def project_template_files() -> Iterator[Path]:
+    """Templates of the apps in this project (not of Django or installed packages) and of TEMPLATES DIRS."""
+    base_dir = Path(settings.BASE_DIR).resolve()
+    directories = [Path(directory) for engine in settings.TEMPLATES for directory in engine.get('DIRS', [])]
+    for app_config in apps.get_app_configs():
+        if base_dir in Path(app_config.path).resolve().parents:
+            directories.append(Path(app_config.path) / 'templates')
+    for directory in directories:
+        yield from sorted(directory.rglob('*.html'))
+
+
+def line_number(text: str, position: int) -> int:
+    return text.count('\n', 0, position) + 1
+
+
+@register(Tags.templates)
+def check_static_references(app_configs=None, **kwargs) -> List[Error]:
+    """Every asset must go through {% static %} and exist, or the hashed manifest cannot serve it."""
+    errors = []
+    for path in project_template_files():
+        text = path.read_text(encoding='utf-8')
+        for match in HARDCODED_STATIC.finditer(text):
+            errors.append(Error(
+                'Hard-coded static path in %s, line %d.' % (path, line_number(text, match.start())),
+                hint="Use {% static 'name' %}, so the hashed file name is rendered.",
+                obj=str(path),
+                id='library.E001',
+            ))
+        for match in STATIC_TAG.finditer(text):
+            if not finders.find(match['name']):
+                errors.append(Error(
+                    'Static file %r referenced in %s, line %d does not exist.' % (
+                        match['name'], path, line_number(text, match.start())),
+                    hint='With the manifest storage the page fails to render until it is fixed.',
+                    obj=str(path),
+                    id='library.E002',
+                ))
+    return errors
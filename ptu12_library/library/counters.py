@@ -0,0 +1,122 @@
+from datetime import date
+from typing import Dict, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest
+from . import fragments
+
+CACHE_KEY = 'library:dashboard_counters'
+COUNTER_NAMES = ('books', 'instances', 'instances_available', 'authors')
+
+
+def cache_timeout() -> int:
+    # the default cache is per process, so other workers pick up changes after this many seconds
+    return getattr(settings, 'LIBRARY_COUNTERS_CACHE_TIMEOUT', 30)
+
+
+def invalidate() -> None:
+    cache.delete(CACHE_KEY)
+
+
+def count_totals() -> Dict[str, int]:
+    from . models import Author, Book, BookInstance
+    return {
+        'books': Book.objects.count(),
+        'instances': BookInstance.objects.count(),
+        'instances_available': BookInstance.objects.filter(status=0).count(),
+        'authors': Author.objects.count(),
+    }
+
+
+def reconcile() -> Dict[str, int]:
+    """Recounts every total from scratch and stores it, correcting any drift."""
+    from . models import DashboardCounter
+    totals = count_totals()
+    with transaction.atomic():
+        for name, value in totals.items():
+            DashboardCounter.objects.update_or_create(name=name, defaults={'value': value})
+        transaction.on_commit(invalidate)
+    return totals
+
+
+def adjust_book_copies(book_id: int, status: int, delta: int) -> None:
+    """Moves the copy counter of a book for the given status bucket by delta."""
+    from . models import Book, BookInstance
+    field = BookInstance.STATUS_COUNTER_FIELDS[status]
+    # a counter that drifted to 0 stays there instead of failing the save; reconcile_counters corrects it
+    Book.objects.filter(pk=book_id).update(**{field: Greatest(F(field) + delta, 0)})
+    fragments.bump(book_id)
+
+
+def reconcile_book_copies(batch_size: int = 1000) -> int:
+    """Recounts copies per book and status, returns the number of corrected books."""
+    from . models import Book, BookInstance
+    fields = list(BookInstance.STATUS_COUNTER_FIELDS.values())
+    actual = {}
+    grouped = BookInstance.objects.order_by().values_list('book_id', 'status').annotate(total=Count('pk'))
+    for book_id, status, total in grouped:
+        actual.setdefault(book_id, {})[BookInstance.STATUS_COUNTER_FIELDS[status]] = total
+    corrected = 0
+    batch = []
+    for book in Book.objects.only('pk', *fields).iterator(chunk_size=batch_size):
+        counts = actual.get(book.pk, {})
+        if any(getattr(book, field) != counts.get(field, 0) for field in fields):
+            for field in fields:
+                setattr(book, field, counts.get(field, 0))
+            batch.append(book)
+        if len(batch) >= batch_size:
+            corrected += Book.objects.bulk_update(batch, fields)
+            fragments.bump(*(book.pk for book in batch))
+            batch = []
+    if batch:
+        corrected += Book.objects.bulk_update(batch, fields)
+        fragments.bump(*(book.pk for book in batch))
+    return corrected
+
+
+def get_counters() -> Dict[str, int]:
+    counters = cache.get(CACHE_KEY)
+    if counters is None:
+        from . models import DashboardCounter
+        counters = dict(DashboardCounter.objects.values_list('name', 'value'))
+        if set(counters) != set(COUNTER_NAMES):
+            counters = reconcile()
+        cache.set(CACHE_KEY, counters, cache_timeout())
+    return counters
+
+
+async def aget_counters() -> Dict[str, int]:
+    counters = await cache.aget(CACHE_KEY)
+    if counters is None:
+        from . models import DashboardCounter
+        counters = {name: value async for name, value in DashboardCounter.objects.values_list('name', 'value')}
+        if set(counters) != set(COUNTER_NAMES):
+            counters = await sync_to_async(reconcile)()
+        await cache.aset(CACHE_KEY, counters, cache_timeout())
+    return counters
+
+
+def bump(**deltas: int) -> None:
+    """Adjusts stored totals, e.g. `bump(books=1)`. Call it after bulk operations that skip signals."""
+    from . models import DashboardCounter
+    for name, delta in deltas.items():
+        if delta:
+            DashboardCounter.objects.filter(name=name).update(value=F('value') + delta)
+    transaction.on_commit(invalidate)
+
+
+def copies_by_status() -> Dict[str, int]:
+    """Copies per status from the per-book counters, e.g. {'available': 120, 'taken': 14, ...}."""
+    from . models import Book, BookInstance
+    fields = BookInstance.STATUS_COUNTER_FIELDS.values()
+    totals = Book.objects.aggregate(**{field: Sum(field) for field in fields})
+    return {field.removesuffix('_count'): totals[field] or 0 for field in fields}
+
+
+def count_overdue(today: Optional[date] = None) -> int:
+    # taken copies past due_back, read through the library_instance_overdue index
+    from . models import BookInstance
+    return BookInstance.objects.filter(status=2, due_back__lt=today or date.today()).count()
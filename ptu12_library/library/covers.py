@@ -0,0 +1,35 @@
+from typing import Any, List
+from PIL import Image
+from ptu12_library.images import ImageVariants
+
+DEFAULT_COVER_SIZE = (491, 500)
+
+
+class CoverVariants(ImageVariants):
+    """JPEG and WebP copies per srcset width; the list tiles use the 320px one, the detail page 640px on dense screens."""
+    name_template = '{stem}_{size}w.{extension}'
+    sizes = (160, 320, 640)
+    formats = {
+        'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+        'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    }
+
+    def sizes_for(self, image: Image.Image) -> List[int]:
+        # never wider than the original; a narrow original gets a single variant at its own width
+        return [width for width in self.sizes if width <= image.width] or [image.width]
+
+    def resize(self, image: Image.Image, size: int) -> Image.Image:
+        height = max(round(image.height * size / image.width), 1)
+        return image.resize((size, height), Image.Resampling.LANCZOS)
+
+    def record(self, size: int, resized: Image.Image) -> Any:
+        return [resized.width, resized.height]
+
+    def size_of(self, record: Any) -> int:
+        return record[0]
+
+
+cover_variants = CoverVariants('library.Book', 'cover', 'cover_sizes')
+variant_name = cover_variants.variant_name
+# module level, so generate_cover_variants can hand it to a process pool
+safe_generate_variants = cover_variants.safe_generate
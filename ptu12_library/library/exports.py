@@ -0,0 +1,110 @@
+import csv
+import json
+import zlib
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+from django.db.models.query import QuerySet
+from . models import Author, Book, BookInstance
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+Column = Tuple[str, Callable[[Any], Any]]
+
+
+def book_rows() -> Tuple[QuerySet, List[Column]]:
+    qs = Book.objects.select_related('author').prefetch_related('genre').defer('search_document')
+    return qs, [
+        ('id', lambda book: book.pk),
+        ('title', lambda book: book.title),
+        ('author_first_name', lambda book: book.author.first_name),
+        ('author_last_name', lambda book: book.author.last_name),
+        ('genres', lambda book: ';'.join(genre.name for genre in book.genre.all())),
+        ('summary', lambda book: book.summary),
+        ('available_count', lambda book: book.available_count),
+        ('copies_count', lambda book: book.copies_count),
+    ]
+
+
+def author_rows() -> Tuple[QuerySet, List[Column]]:
+    qs = Author.objects.all()
+    return qs, [
+        ('id', lambda author: author.pk),
+        ('first_name', lambda author: author.first_name),
+        ('last_name', lambda author: author.last_name),
+        ('biography', lambda author: author.biography or ''),
+    ]
+
+
+def copy_rows() -> Tuple[QuerySet, List[Column]]:
+    qs = BookInstance.objects.select_related('book', 'reader').only(
+        'id', 'status', 'due_back', 'late_fee', 'book__id', 'book__title', 'reader__username',
+    )
+    return qs, [
+        ('id', lambda copy: str(copy.pk)),
+        ('book_id', lambda copy: copy.book.pk),
+        ('book_title', lambda copy: copy.book.title),
+        ('status', lambda copy: copy.get_status_display()),
+        ('due_back', lambda copy: copy.due_back.isoformat() if copy.due_back else None),
+        ('reader', lambda copy: copy.reader.username if copy.reader else None),
+        ('late_fee', lambda copy: str(copy.late_fee)),
+    ]
+
+
+DATASETS = {
+    'books': book_rows,
+    'authors': author_rows,
+    'copies': copy_rows,
+}
+
+
+class Echo:
+    """File-like object handing back whatever csv.writer writes to it."""
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_records(dataset: str) -> Tuple[List[str], Iterator[List[Any]]]:
+    qs, columns = DATASETS[dataset]()
+    header = [name for name, accessor in columns]
+    # .iterator() streams through a server-side cursor on Postgres, prefetching per chunk
+    objects = qs.order_by('pk').iterator(chunk_size=CHUNK_SIZE)
+    return header, ([accessor(obj) for name, accessor in columns] for obj in objects)
+
+
+def iter_csv(header: List[str], records: Iterable[List[Any]]) -> Iterator[bytes]:
+    writer = csv.writer(Echo())
+    yield writer.writerow(header).encode()
+    for record in records:
+        yield writer.writerow(record).encode()
+
+
+def iter_jsonl(header: List[str], records: Iterable[List[Any]]) -> Iterator[bytes]:
+    for record in records:
+        yield (json.dumps(dict(zip(header, record)), ensure_ascii=False) + '\n').encode()
+
+
+def iter_gzip(chunks: Iterable[bytes], buffer_size: int = 64 * 1024) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(compressor.compress(chunk))
+        pending_size += len(pending[-1])
+        if pending_size >= buffer_size:
+            yield b''.join(pending)
+            pending, pending_size = [], 0
+    pending.append(compressor.flush())
+    yield b''.join(pending)
+
+
+def export_stream(dataset: str, format: str, compress: bool = False) -> Iterator[bytes]:
+    header, records = iter_records(dataset)
+    chunks = iter_csv(header, records) if format == 'csv' else iter_jsonl(header, records)
+    return iter_gzip(chunks) if compress else chunks
+
+
+def export_filename(dataset: str, format: str, compress: bool = False) -> str:
+    return f"{dataset}.{format}{'.gz' if compress else ''}"
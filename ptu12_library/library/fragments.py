@@ -0,0 +1,74 @@
+import time
+from typing import Callable, Iterable
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'library:book:%s:version'
+FRAGMENT_KEY = 'library:book:%s:%s:%s:%s'
+# how long a render may hold the lock, and how long other requests wait for it before rendering themselves
+LOCK_SECONDS = 10
+LOCK_WAIT_SECONDS = 2.0
+LOCK_POLL_SECONDS = 0.05
+
+
+def fragment_timeout() -> int:
+    # with the default per-process cache a version bump only reaches the worker that made it,
+    # the others render the change when their copy expires
+    return getattr(settings, 'LIBRARY_FRAGMENT_CACHE_SECONDS', 60)
+
+
+def book_version(book_id: int) -> int:
+    version = cache.get(VERSION_KEY % book_id)
+    if version is None:
+        # a version key that was evicted must not restart at a number its old fragments were stored under
+        cache.add(VERSION_KEY % book_id, time.time_ns(), None)
+        version = cache.get(VERSION_KEY % book_id, 0)
+    return version
+
+
+def bump_now(book_ids: Iterable[int]) -> None:
+    for book_id in set(book_ids):
+        try:
+            cache.incr(VERSION_KEY % book_id)
+        except ValueError:
+            # nothing cached under any version yet
+            pass
+
+
+def bump(*book_ids: int) -> None:
+    """Retires the cached fragments of the books once the current transaction commits.
+
+    Bumping before the commit would let a concurrent request cache what it
+    still reads as the old state under the new version.
+    """
+    transaction.on_commit(lambda: bump_now(book_ids))
+
+
+def get_or_render(book_id: int, name: str, vary: Iterable[str], render: Callable[[], str]) -> str:
+    """A fragment of a book's page, rendered by one request at a time when it is missing.
+
+    The request that takes the lock renders and stores it; the others poll
+    for its result for up to LOCK_WAIT_SECONDS and only then render for
+    themselves, so an expiry or a bump on a popular book costs one render
+    instead of one per worker.
+    """
+    key = FRAGMENT_KEY % (book_id, book_version(book_id), name, ':'.join(vary))
+    html = cache.get(key)
+    if html is not None:
+        return html
+    lock = key + ':lock'
+    if cache.add(lock, 1, LOCK_SECONDS):
+        try:
+            html = render()
+            cache.set(key, html, fragment_timeout())
+        finally:
+            cache.delete(lock)
+        return html
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_SECONDS)
+        html = cache.get(key)
+        if html is not None:
+            return html
+    return render()
@@ -0,0 +1,162 @@
+import csv
+import json
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from django.db import transaction
+from django.db.models import F
+from . import counters, fragments
+from . models import Author, Book, BookInstance, Genre
+from . search import normalize_text, update_books_search_documents
+
+
+def read_rows(stream, format: str) -> Iterator[Dict[str, Any]]:
+    """Yields catalog rows from CSV (with a header) or JSON Lines, one at a time."""
+    if format == 'csv':
+        for row in csv.DictReader(stream):
+            row['genres'] = [name for name in (row.get('genres') or '').split(';') if name.strip()]
+            yield row
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+class CatalogImporter:
+    """Upserts authors, genres, books, their genres and copies in batches.
+
+    Authors and genres are looked up by natural key once and remembered, books
+    are matched on (title, author). A row's `copies` is the number of copies a
+    book should have at least; missing ones are added as available.
+    """
+    def __init__(self):
+        self.authors: Dict[Tuple[str, str], int] = {}
+        self.genres: Dict[str, int] = {}
+        self.stats = {'rows': 0, 'authors': 0, 'genres': 0, 'books': 0, 'updated_books': 0, 'copies': 0}
+
+    def import_batch(self, rows: List[Dict[str, Any]]) -> None:
+        rows = [row for row in rows if (row.get('title') or '').strip()]
+        with transaction.atomic():
+            self._load_authors(rows)
+            self._load_genres(rows)
+            books, existing = self._upsert_books(rows)
+            self._link_genres(rows, books)
+            self._add_copies(rows, books)
+            # new books got their search document on insert, matched ones may have changed
+            update_books_search_documents(existing)
+        self.stats['rows'] += len(rows)
+
+    @staticmethod
+    def author_key(row: Dict[str, Any]) -> Tuple[str, str]:
+        return (row.get('author_first_name') or '').strip(), (row.get('author_last_name') or '').strip()
+
+    @staticmethod
+    def book_key(row: Dict[str, Any], author_id: int) -> Tuple[str, int]:
+        return row['title'].strip(), author_id
+
+    def _load_authors(self, rows: Iterable[Dict[str, Any]]) -> None:
+        missing = {self.author_key(row) for row in rows} - set(self.authors)
+        if not missing:
+            return
+        existing = Author.objects.filter(
+            last_name__in={last for first, last in missing},
+        ).values_list('first_name', 'last_name', 'pk')
+        for first, last, pk in existing:
+            self.authors.setdefault((first, last), pk)
+        new = [
+            # bulk_create skips save(), so the normalized search name is filled here
+            Author(first_name=first, last_name=last, search_name=normalize_text(f"{first} {last}"))
+            for first, last in missing if (first, last) not in self.authors
+        ]
+        for author in Author.objects.bulk_create(new):
+            self.authors[(author.first_name, author.last_name)] = author.pk
+        self.stats['authors'] += len(new)
+        counters.bump(authors=len(new))
+
+    def _load_genres(self, rows: Iterable[Dict[str, Any]]) -> None:
+        names = {name.strip() for row in rows for name in row.get('genres') or [] if name.strip()}
+        missing = names - set(self.genres)
+        if not missing:
+            return
+        for name, pk in Genre.objects.filter(name__in=missing).values_list('name', 'pk'):
+            self.genres.setdefault(name, pk)
+        new = [Genre(name=name) for name in missing if name not in self.genres]
+        for genre in Genre.objects.bulk_create(new):
+            self.genres[genre.name] = genre.pk
+        self.stats['genres'] += len(new)
+
+    def _upsert_books(self, rows: List[Dict[str, Any]]) -> Tuple[Dict[Tuple[str, int], int], List[int]]:
+        wanted = {}
+        words = {}
+        for row in rows:
+            author_key = self.author_key(row)
+            key = self.book_key(row, self.authors[author_key])
+            wanted[key] = row.get('summary') or ''
+            # author names and genres, in the order build_search_document() uses
+            words.setdefault(key, [*author_key]).extend(
+                name.strip() for name in row.get('genres') or [] if name.strip()
+            )
+        books = {}
+        changed = []
+        existing = Book.objects.filter(
+            title__in={title for title, author_id in wanted},
+            author_id__in={author_id for title, author_id in wanted},
+        ).only('pk', 'title', 'author_id', 'summary')
+        for book in existing:
+            key = (book.title, book.author_id)
+            if key in wanted and key not in books:
+                books[key] = book.pk
+                if wanted[key] and book.summary != wanted[key]:
+                    book.summary = wanted[key]
+                    changed.append(book)
+        Book.objects.bulk_update(changed, ['summary'])
+        fragments.bump(*(book.pk for book in changed))
+        existing = list(books.values())
+        new = [
+            Book(
+                title=title,
+                author_id=author_id,
+                summary=summary,
+                search_document=normalize_text(' '.join([title, *words[(title, author_id)], summary])),
+            )
+            for (title, author_id), summary in wanted.items() if (title, author_id) not in books
+        ]
+        for book in Book.objects.bulk_create(new):
+            books[(book.title, book.author_id)] = book.pk
+        self.stats['books'] += len(new)
+        self.stats['updated_books'] += len(changed)
+        counters.bump(books=len(new))
+        return books, existing
+
+    def _link_genres(self, rows: List[Dict[str, Any]], books: Dict[Tuple[str, int], int]) -> None:
+        Through = Book.genre.through
+        links = {
+            (books[self.book_key(row, self.authors[self.author_key(row)])], self.genres[name.strip()])
+            for row in rows for name in row.get('genres') or [] if name.strip()
+        }
+        Through.objects.bulk_create(
+            [Through(book_id=book_id, genre_id=genre_id) for book_id, genre_id in links],
+            ignore_conflicts=True,
+        )
+
+    def _add_copies(self, rows: List[Dict[str, Any]], books: Dict[Tuple[str, int], int]) -> None:
+        wanted = {}
+        for row in rows:
+            book_id = books[self.book_key(row, self.authors[self.author_key(row)])]
+            wanted[book_id] = max(wanted.get(book_id, 0), int(row.get('copies') or 0))
+        have = dict(
+            (book.pk, book.copies_count) for book in Book.objects.filter(pk__in=wanted).only(
+                'pk', *BookInstance.STATUS_COUNTER_FIELDS.values())
+        )
+        new = []
+        books_by_missing = defaultdict(list)
+        for book_id, copies in wanted.items():
+            missing = copies - have.get(book_id, 0)
+            if missing > 0:
+                new.extend(BookInstance(book_id=book_id, status=0) for i in range(missing))
+                books_by_missing[missing].append(book_id)
+        BookInstance.objects.bulk_create(new)
+        for missing, book_ids in books_by_missing.items():
+            Book.objects.filter(pk__in=book_ids).update(available_count=F('available_count') + missing)
+            fragments.bump(*book_ids)
+        self.stats['copies'] += len(new)
+        counters.bump(instances=len(new), instances_available=len(new))
@@ -0,0 +1,105 @@
+import time
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from importlib import import_module
+from typing import Any, Dict, Optional
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from . import counters
+from . models import BookInstance
+
+TAKEN, UNAVAILABLE = 2, 3
+
+
+def sweep_overdue(
+    today: Optional[date] = None,
+    batch_size: int = 1000,
+    fee_per_day: Optional[Decimal] = None,
+    lost_after: Optional[int] = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """Accrues late fees on overdue taken copies and optionally marks long-overdue ones unavailable.
+
+    Overdue copies are walked in (due_back, id) order through the
+    library_instance_overdue index, one bounded batch of keys at a time, and
+    each batch is changed with a few set-based UPDATEs. Fees accrue for the
+    days since `fees_accrued_until`, so running the sweep twice a day is safe.
+    """
+    today = today or date.today()
+    if fee_per_day is None:
+        fee_per_day = Decimal(str(getattr(settings, 'LIBRARY_LATE_FEE_PER_DAY', '0.10')))
+    started = time.perf_counter()
+    result = {'overdue': 0, 'charged': 0, 'fees': Decimal('0'), 'marked_unavailable': 0, 'batches': 0}
+    overdue = BookInstance.objects.filter(status=TAKEN, due_back__lt=today).order_by('due_back', 'id')
+    last = None
+    while True:
+        batch_qs = overdue
+        if last is not None:
+            batch_qs = batch_qs.filter(Q(due_back__gt=last[0]) | Q(due_back=last[0], id__gt=last[1]))
+        rows = list(batch_qs.values_list('id', 'book_id', 'due_back', 'fees_accrued_until')[:batch_size])
+        if not rows:
+            break
+        last = (rows[-1][2], rows[-1][0])
+        result['overdue'] += len(rows)
+        result['batches'] += 1
+
+        # grouped by the accrual date that was read, so each UPDATE can check it is still the same
+        by_days = defaultdict(list)
+        lost_by_book = defaultdict(list)
+        for pk, book_id, due_back, accrued_until in rows:
+            days = (today - max(due_back, accrued_until or due_back)).days
+            if days > 0:
+                by_days[days, accrued_until].append(pk)
+            if lost_after is not None and (today - due_back).days > lost_after:
+                lost_by_book[book_id].append(pk)
+
+        if dry_run:
+            result['charged'] += sum(len(ids) for ids in by_days.values())
+            result['fees'] += sum(fee_per_day * days * len(ids) for (days, accrued_until), ids in by_days.items())
+            result['marked_unavailable'] += sum(len(ids) for ids in lost_by_book.values())
+            continue
+        with transaction.atomic():
+            for (days, accrued_until), ids in by_days.items():
+                # a copy returned or charged by another sweep since the batch was read is left alone
+                charged = BookInstance.objects.filter(
+                    pk__in=ids, status=TAKEN, fees_accrued_until=accrued_until,
+                ).update(
+                    late_fee=F('late_fee') + fee_per_day * days,
+                    fees_accrued_until=today,
+                )
+                result['charged'] += charged
+                result['fees'] += fee_per_day * days * charged
+            for book_id, ids in lost_by_book.items():
+                # a copy returned since the batch was read is no longer taken and is left alone
+                moved = BookInstance.objects.filter(pk__in=ids, status=TAKEN).update(status=UNAVAILABLE)
+                result['marked_unavailable'] += moved
+                # the UPDATE bypasses signals; taken and unavailable are both unavailable to readers,
+                # so only the per-book buckets move
+                if moved:
+                    counters.adjust_book_copies(book_id, TAKEN, -moved)
+                    counters.adjust_book_copies(book_id, UNAVAILABLE, moved)
+    result['elapsed'] = time.perf_counter() - started
+    return result
+
+
+def clear_expired_sessions(batch_size: int = 5000) -> int:
+    """Deletes expired database sessions a bounded batch at a time, unlike clearsessions' single DELETE.
+
+    Session engines without a table (cache, signed_cookies) clean up after
+    themselves; for those this only calls their own clear_expired().
+    """
+    engine = import_module(settings.SESSION_ENGINE)
+    if not hasattr(engine.SessionStore, 'get_model_class'):
+        engine.SessionStore.clear_expired()
+        return 0
+    Session = engine.SessionStore.get_model_class()
+    expired = Session.objects.filter(expire_date__lt=timezone.now()).values_list('session_key', flat=True)
+    deleted = 0
+    while True:
+        keys = list(expired[:batch_size])
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys).delete()[0]
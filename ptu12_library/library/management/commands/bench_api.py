@@ -0,0 +1,47 @@
+import time
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = 'Compares in-process throughput of the JSON catalog API with the HTML catalog pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+
+    def targets(self):
+        books_api = reverse('api_list', kwargs={'resource': 'books'})
+        return [
+            ('HTML book list', reverse('book_list')),
+            ('API books', books_api),
+            ('API books, sparse', f"{books_api}?fields=id,title"),
+            ('API books, with copies and reviews', f"{books_api}?fields=id,title,genres,copies,reviews"),
+            ('HTML author list', reverse('author_list')),
+            ('API authors', reverse('api_list', kwargs={'resource': 'authors'})),
+        ]
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        # keep one connection for the whole run, like a persistent connection in a worker would
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        client = Client()
+        count = options['requests']
+        self.stdout.write('%-36s %10s %8s %10s' % ('target', 'req/s', 'queries', 'bytes'))
+        for label, url in self.targets():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError('%s returned %d.' % (url, response.status_code))
+            queries = []
+            with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                client.get(url)
+            started = time.perf_counter()
+            for i in range(count):
+                client.get(url)
+            elapsed = time.perf_counter() - started
+            self.stdout.write('%-36s %10.1f %8d %10d' % (
+                label, count / elapsed, len(queries), len(response.content),
+            ))
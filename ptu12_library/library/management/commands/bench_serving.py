@@ -0,0 +1,63 @@
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+from django.core.management.base import BaseCommand, CommandError
+
+PATHS = ['/', '/authors/', '/books/', '/books/?available=1', '/books/?query=the']
+
+
+class Command(BaseCommand):
+    help = ('Measures concurrent-request throughput of running servers, e.g. gunicorn with sync workers '
+            'against gunicorn with uvicorn workers: bench_serving http://localhost:8000 http://localhost:8001')
+
+    def add_arguments(self, parser):
+        parser.add_argument('servers', nargs='+', help='Base URLs of the servers to compare.')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request, repeatable. Defaults to the catalog pages.')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def fetch(self, url: str, timeout: float) -> float:
+        started = time.perf_counter()
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+        return time.perf_counter() - started
+
+    def run(self, server: str, paths: List[str], count: int, concurrency: int, timeout: float):
+        urls = [server.rstrip('/') + paths[i % len(paths)] for i in range(count)]
+        errors = 0
+        latencies = []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(self.fetch, url, timeout) for url in urls]
+            for future in futures:
+                try:
+                    latencies.append(future.result())
+                except (urllib.error.URLError, OSError):
+                    errors += 1
+        return time.perf_counter() - started, latencies, errors
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        paths = options['paths'] or PATHS
+        count, concurrency = options['requests'], options['concurrency']
+        self.stdout.write('%-32s %10s %10s %10s %8s' % ('server', 'req/s', 'p50 ms', 'p95 ms', 'errors'))
+        for server in options['servers']:
+            try:
+                # warm up: templates, connections and caches
+                for path in paths:
+                    self.fetch(server.rstrip('/') + path, options['timeout'])
+            except (urllib.error.URLError, OSError) as e:
+                raise CommandError('%s is not answering: %s' % (server, e))
+            elapsed, latencies, errors = self.run(server, paths, count, concurrency, options['timeout'])
+            if len(latencies) > 1:
+                cuts = statistics.quantiles(latencies, n=20)
+                p50, p95 = cuts[9] * 1000, cuts[18] * 1000
+            else:
+                p50 = p95 = 0
+            self.stdout.write('%-32s %10.1f %10.1f %10.1f %8d' % (
+                server, len(latencies) / elapsed, p50, p95, errors,
+            ))
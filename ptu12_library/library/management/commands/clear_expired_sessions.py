@@ -0,0 +1,17 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+from library.jobs import clear_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired sessions in bounded batches. Meant to run daily from a scheduler.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        try:
+            deleted = clear_expired_sessions(batch_size=options['batch_size'])
+        except Exception as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS('%d expired sessions deleted.' % deleted))
@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+from library import exports
+
+
+class Command(BaseCommand):
+    help = 'Streams books, authors or copies to a CSV or JSON Lines file without loading them all into memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS))
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--output', type=Path, default=None,
+                            help='defaults to <dataset>.<format>[.gz] in the current directory, "-" for stdout')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        dataset, format, compress = options['dataset'], options['format'], options['gzip']
+        output = options['output'] or Path(exports.export_filename(dataset, format, compress))
+        chunks = exports.export_stream(dataset, format, compress)
+        written = 0
+        try:
+            if str(output) == '-':
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                return
+            with output.open('wb') as stream:
+                for chunk in chunks:
+                    stream.write(chunk)
+                    written += len(chunk)
+        except OSError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS('%d bytes written to %s.' % (written, output)))
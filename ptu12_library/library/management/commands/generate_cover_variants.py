@@ -0,0 +1,44 @@
+import os
+import time
+from collections import defaultdict
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from library.covers import safe_generate_variants
+from library.models import Book
+from ptu12_library.pools import process_pool
+
+
+class Command(BaseCommand):
+    help = 'Generates the thumbnail and WebP variants of existing book covers across a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate covers that already have variants.')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1.')
+        qs = Book.objects.exclude(Q(cover='') | Q(cover__isnull=True))
+        if not options['force']:
+            qs = qs.filter(cover_sizes=[])
+        books = defaultdict(list)
+        for pk, name in qs.values_list('pk', 'cover').iterator():
+            books[name].append(pk)
+        if not books:
+            self.stdout.write(self.style.SUCCESS('All covers have their variants.'))
+            return
+        # workers only read and write files; the parent keeps the database to itself
+        started = time.perf_counter()
+        done = failed = 0
+        with process_pool(options['workers']) as pool:
+            for name, sizes in pool.map(safe_generate_variants, list(books), chunksize=4):
+                if sizes is None:
+                    failed += 1
+                    continue
+                Book.objects.filter(pk__in=books[name], cover=name).update(cover_sizes=sizes)
+                done += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write('covers: %d, failed: %d, %.1f covers/s' % (done, failed, done / elapsed if elapsed else 0))
+        self.stdout.write(self.style.SUCCESS('Cover variants generated.'))
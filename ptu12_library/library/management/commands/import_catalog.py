@@ -0,0 +1,68 @@
+import json
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+from library.importer import CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Imports authors, genres, books and copies from a CSV or JSON Lines file in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--format', choices=('csv', 'jsonl'), default=None,
+                            help='defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--checkpoint', type=Path, default=None,
+                            help='file recording imported rows, an interrupted import resumes from it')
+
+    def read_checkpoint(self, checkpoint: Path | None, path: Path) -> int:
+        if checkpoint is None or not checkpoint.exists():
+            return 0
+        state = json.loads(checkpoint.read_text())
+        if state.get('path') != str(path.resolve()):
+            raise CommandError('Checkpoint %s belongs to %s.' % (checkpoint, state.get('path')))
+        return state['rows']
+
+    def write_checkpoint(self, checkpoint: Path | None, path: Path, rows: int) -> None:
+        if checkpoint is None:
+            return
+        temporary = checkpoint.with_suffix('.tmp')
+        temporary.write_text(json.dumps({'path': str(path.resolve()), 'rows': rows}))
+        temporary.replace(checkpoint)
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        path, checkpoint = options['path'], options['checkpoint']
+        format = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'jsonl')
+        done = self.read_checkpoint(checkpoint, path)
+        importer = CatalogImporter()
+        started = time.perf_counter()
+        with path.open(newline='', encoding='utf-8') as stream:
+            rows = read_rows(stream, format)
+            if done:
+                self.stdout.write('Resuming after %d rows.' % done)
+                for skipped in islice(rows, done):
+                    pass
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                try:
+                    importer.import_batch(batch)
+                except Exception as e:
+                    raise CommandError('Batch starting at row %d failed: %s' % (done + 1, e))
+                done += len(batch)
+                self.write_checkpoint(checkpoint, path, done)
+                elapsed = time.perf_counter() - started
+                self.stdout.write('%d rows imported, %.0f rows/s' % (done, importer.stats['rows'] / elapsed))
+        elapsed = time.perf_counter() - started
+        stats = importer.stats
+        self.stdout.write(
+            '%(authors)d authors, %(genres)d genres, %(books)d books (%(updated_books)d updated), '
+            '%(copies)d copies created.' % stats
+        )
+        self.stdout.write(self.style.SUCCESS('%d rows in %.2f s, %.0f rows/s.' % (
+            stats['rows'], elapsed, stats['rows'] / elapsed if elapsed else 0,
+        )))
@@ -0,0 +1,73 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+
+PATHS = ['/', '/books/', '/authors/', '/accounts/login/']
+
+# runs in a fresh interpreter, so nothing is imported, compiled or connected yet
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+timings = {'setup': time.perf_counter() - started}
+if sys.argv[1] == 'warm':
+    from ptu12_library.warmup import warm_up
+    mark = time.perf_counter()
+    warm_up()
+    timings['warmup'] = time.perf_counter() - mark
+from django.test import Client
+client = Client()
+for label in ('first_requests', 'second_requests'):
+    mark = time.perf_counter()
+    for path in sys.argv[2:]:
+        status = client.get(path).status_code
+        if status >= 500:
+            raise SystemExit('%s answered %d' % (path, status))
+    timings[label] = time.perf_counter() - mark
+print(json.dumps(timings))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Measures worker startup and first-request latency in fresh processes, with and without warmup.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request, repeatable. Defaults to the main pages.')
+
+    def measure(self, mode: str, paths):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', CHILD, mode, *paths],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr else 'child failed')
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        timings['process'] = time.perf_counter() - started
+        return timings
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        paths = options['paths'] or PATHS
+        columns = ['process', 'setup', 'warmup', 'first_requests', 'second_requests']
+        self.stdout.write('%-6s ' % 'mode' + ' '.join('%15s' % column for column in columns) + '   (median ms)')
+        for mode in ('cold', 'warm'):
+            runs = [self.measure(mode, paths) for i in range(options['runs'])]
+            medians = [
+                '%15.1f' % (statistics.median(run[column] for run in runs) * 1000) if column in runs[0] else '%15s' % '-'
+                for column in columns
+            ]
+            self.stdout.write('%-6s ' % mode + ' '.join(medians))
+        self.stdout.write(self.style.SUCCESS(
+            'In a preloaded gunicorn master the warmup runs before forking, '
+            'so workers start with the "warm" first-request latency.'
+        ))
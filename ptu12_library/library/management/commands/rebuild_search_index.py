@@ -0,0 +1,18 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+from library.models import Book
+from library.search import update_search_documents
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the full-text search document of every book.'
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        try:
+            updated_count = update_search_documents(Book.objects.all())
+        except Exception as e:
+            raise CommandError(e)
+        else:
+            self.stdout.write(
+                self.style.SUCCESS('%d book search documents updated.' % updated_count)
+            )
@@ -0,0 +1,19 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+from library import counters
+
+
+class Command(BaseCommand):
+    help = 'Recounts the index page totals and per-book copy counters. Schedule it to correct drift.'
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        try:
+            totals = counters.reconcile()
+            corrected_books = counters.reconcile_book_copies()
+        except Exception as e:
+            raise CommandError(e)
+        else:
+            for name, value in totals.items():
+                self.stdout.write('%s: %d' % (name, value))
+            self.stdout.write('books with corrected copy counters: %d' % corrected_books)
+            self.stdout.write(self.style.SUCCESS('Counters reconciled.'))
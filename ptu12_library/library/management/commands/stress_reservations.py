@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from library import counters
+from library.models import Author, Book, BookInstance
+from library.reservations import NoCopyAvailable, reserve_copy
+
+User = get_user_model()
+
+
+def reserve_concurrently(book: Book, readers: list, workers: int) -> dict:
+    """Lets every reader try to reserve a copy of the book from a pool of threads."""
+    due_back = date.today() + timedelta(days=14)
+
+    def attempt(reader):
+        try:
+            for retry in range(50):
+                try:
+                    return reserve_copy(book, reader, due_back).pk
+                except OperationalError:
+                    # SQLite reports a busy database instead of waiting for the lock
+                    time.sleep(0.005 * (retry + 1))
+            return None
+        except NoCopyAvailable:
+            return None
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        claimed = [pk for pk in pool.map(attempt, readers) if pk is not None]
+    elapsed = time.perf_counter() - started
+    return {
+        'claimed': claimed,
+        'elapsed': elapsed,
+        'per_second': len(readers) / elapsed if elapsed else 0,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Reserves copies of a scratch book from many parallel workers and checks no copy is given twice.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--copies', type=int, default=100)
+        parser.add_argument('--readers', type=int, default=150)
+        parser.add_argument('--workers', type=int, default=16)
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        author = Author.objects.create(first_name='Stress', last_name='Test')
+        book = Book.objects.create(title='Reservation stress test', summary='', author=author)
+        readers = [
+            User.objects.create(username=f"stress-reader-{book.pk}-{i}")
+            for i in range(options['readers'])
+        ]
+        try:
+            BookInstance.objects.bulk_create(
+                BookInstance(book=book, status=0) for i in range(options['copies'])
+            )
+            counters.bump(instances=options['copies'], instances_available=options['copies'])
+            counters.adjust_book_copies(book.pk, 0, options['copies'])
+            result = reserve_concurrently(book, readers, options['workers'])
+            claimed = result['claimed']
+            reserved = BookInstance.objects.filter(book=book, status=1)
+            if len(claimed) != len(set(claimed)) or reserved.count() != len(claimed):
+                raise CommandError('A copy was allocated more than once.')
+            if reserved.values('reader').distinct().count() != len(claimed):
+                raise CommandError('A reader got more than one copy.')
+            self.stdout.write('%d of %d readers got one of %d copies in %.2f s (%.1f reservations/s).' % (
+                len(claimed), len(readers), options['copies'], result['elapsed'], result['per_second'],
+            ))
+            self.stdout.write(self.style.SUCCESS('No double allocation.'))
+        finally:
+            book.delete()
+            author.delete()
+            User.objects.filter(pk__in=[reader.pk for reader in readers]).delete()
@@ -0,0 +1,65 @@
+import statistics
+from collections import Counter, defaultdict
+from typing import Any
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ptu12_library.profiling import read_log_entries
+
+SORT_COLUMNS = ('count', 'p50', 'p95', 'queries', 'repeated', 'db')
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Summarizes the slow request log written by ProfilingMiddleware, grouped by URL name.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Log file, REQUEST_PROFILING_LOG by default.')
+        parser.add_argument('--sort', choices=SORT_COLUMNS, default='p95')
+        parser.add_argument('--queries', type=int, default=1,
+                            help='Most repeated queries shown under each URL name.')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        path = options['log'] or settings.REQUEST_PROFILING_LOG
+        try:
+            entries = read_log_entries(path)
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        if not entries:
+            raise CommandError('%s has no entries.' % path)
+
+        grouped = defaultdict(list)
+        for entry in entries:
+            grouped[entry['url_name'] or entry['path']].append(entry)
+        rows = []
+        for url_name, group in grouped.items():
+            repeated_sql = Counter()
+            for entry in group:
+                for query in entry['top_queries']:
+                    if query['count'] > 1:
+                        repeated_sql[query['sql']] += query['count']
+            rows.append({
+                'url_name': url_name,
+                'count': len(group),
+                'p50': statistics.median(entry['total_ms'] for entry in group),
+                'p95': percentile([entry['total_ms'] for entry in group], 0.95),
+                'queries': statistics.mean(entry['queries'] for entry in group),
+                'repeated': statistics.mean(entry['repeated'] for entry in group),
+                'db': statistics.mean(entry['db_ms'] for entry in group),
+                'template': statistics.mean(entry['template_ms'] for entry in group),
+                'repeated_sql': repeated_sql.most_common(options['queries']),
+            })
+        rows.sort(key=lambda row: row[options['sort']], reverse=True)
+
+        self.stdout.write('%-32s %6s %9s %9s %8s %8s %9s %9s' % (
+            'url name', 'count', 'p50 ms', 'p95 ms', 'queries', 'repeated', 'db ms', 'tpl ms'))
+        for row in rows:
+            self.stdout.write('%-32s %6d %9.1f %9.1f %8.1f %8.1f %9.1f %9.1f' % (
+                row['url_name'][:32], row['count'], row['p50'], row['p95'],
+                row['queries'], row['repeated'], row['db'], row['template']))
+            for sql, count in row['repeated_sql']:
+                self.stdout.write('    %dx %s' % (count, sql[:120]))
+        self.stdout.write(self.style.SUCCESS('%d slow requests in %s.' % (len(entries), path)))
@@ -0,0 +1,34 @@
+from decimal import Decimal
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+from library.jobs import sweep_overdue
+
+
+class Command(BaseCommand):
+    help = 'Accrues late fees on overdue copies in bounded batches. Meant to run daily from a scheduler.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--fee-per-day', type=Decimal, default=None,
+                            help='defaults to the LIBRARY_LATE_FEE_PER_DAY setting')
+        parser.add_argument('--lost-after', type=int, default=None,
+                            help='mark copies overdue by more than this many days as unavailable')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        try:
+            result = sweep_overdue(
+                batch_size=options['batch_size'],
+                fee_per_day=options['fee_per_day'],
+                lost_after=options['lost_after'],
+                dry_run=options['dry_run'],
+            )
+        except Exception as e:
+            raise CommandError(e)
+        self.stdout.write(
+            '%(overdue)d overdue copies in %(batches)d batches, %(charged)d charged %(fees)s in total, '
+            '%(marked_unavailable)d marked unavailable.' % result
+        )
+        self.stdout.write(self.style.SUCCESS(
+            '%s finished in %.2f s.' % ('Dry run' if options['dry_run'] else 'Sweep', result['elapsed'])
+        ))
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:05
+
+import html
+import unicodedata
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+SEARCH_CONFIG = 'simple'
+SEARCH_INDEX_NAME = 'library_book_search_gin'
+
+
+def normalize_text(text):
+    """A frozen copy of library.search.normalize_text, which may change after this migration."""
+    if not text:
+        return ''
+    text = html.unescape(strip_tags(text))
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+def fill_search_document(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    books = Book.objects.using(schema_editor.connection.alias)
+    for book in books.select_related('author').prefetch_related('genre'):
+        parts = [book.title, book.author.first_name, book.author.last_name]
+        parts.extend(genre.name for genre in book.genre.all())
+        parts.append(book.summary)
+        book.search_document = normalize_text(' '.join(part for part in parts if part))
+        book.save(update_fields=['search_document'])
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX_NAME} ON library_book "
+        f"USING GIN (to_tsvector('{SEARCH_CONFIG}'::regconfig, search_document))"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {SEARCH_INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_bookreview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='search document'),
+        ),
+        migrations.RunPython(fill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
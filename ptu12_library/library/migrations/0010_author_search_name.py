@@ -0,0 +1,69 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:06
+
+import html
+import unicodedata
+from django.db import DatabaseError, migrations, models, transaction
+from django.utils.html import strip_tags
+
+AUTHOR_TRIGRAM_INDEX_NAME = 'library_author_search_name_trgm'
+
+
+# library.search.normalize_text as of this migration; later changes to it must not change what it stored
+def normalize_text(text):
+    if not text:
+        return ''
+    text = html.unescape(strip_tags(text))
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+def fill_search_name(apps, schema_editor):
+    Author = apps.get_model('library', 'Author')
+    authors = Author.objects.using(schema_editor.connection.alias)
+    for author in authors.all():
+        author.search_name = normalize_text(f"{author.first_name} {author.last_name}")
+        author.save(update_fields=['search_name'])
+
+
+def create_trigram_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        # no privileges to install the extension, search falls back to LIKE
+        return
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {AUTHOR_TRIGRAM_INDEX_NAME} ON library_author "
+        f"USING GIN (search_name gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {AUTHOR_TRIGRAM_INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_book_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='search_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=101, verbose_name='search name'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['search_name'], name='library_author_search_name', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    DashboardCounter = apps.get_model('library', 'DashboardCounter')
+    BookInstance = apps.get_model('library', 'BookInstance')
+    totals = {
+        'books': apps.get_model('library', 'Book').objects.using(alias).count(),
+        'instances': BookInstance.objects.using(alias).count(),
+        'instances_available': BookInstance.objects.using(alias).filter(status=0).count(),
+        'authors': apps.get_model('library', 'Author').objects.using(alias).count(),
+    }
+    DashboardCounter.objects.using(alias).bulk_create(
+        DashboardCounter(name=name, value=value) for name, value in totals.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_author_search_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='name')),
+                ('value', models.BigIntegerField(default=0, verbose_name='value')),
+            ],
+            options={
+                'verbose_name': 'dashboard counter',
+                'verbose_name_plural': 'dashboard counters',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
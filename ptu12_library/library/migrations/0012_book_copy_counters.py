@@ -0,0 +1,62 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:10
+
+from django.db import migrations, models
+from django.db.models import Count
+
+STATUS_COUNTER_FIELDS = {
+    0: 'available_count',
+    1: 'reserved_count',
+    2: 'taken_count',
+    3: 'unavailable_count',
+    7: 'broken_count',
+}
+
+
+def fill_copy_counters(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Book = apps.get_model('library', 'Book')
+    BookInstance = apps.get_model('library', 'BookInstance')
+    grouped = BookInstance.objects.using(alias).order_by().values_list(
+        'book_id', 'status').annotate(total=Count('pk'))
+    for book_id, status, total in grouped:
+        Book.objects.using(alias).filter(pk=book_id).update(**{STATUS_COUNTER_FIELDS[status]: total})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='available_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='available copies'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='broken_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='broken copies'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='reserved_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='reserved copies'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='taken_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='taken copies'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='unavailable_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='unavailable copies'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available_count__gt', 0)), fields=['title', 'id'], name='library_book_available_title'),
+        ),
+        migrations.RunPython(fill_copy_counters, migrations.RunPython.noop),
+    ]
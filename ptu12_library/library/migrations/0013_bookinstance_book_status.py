@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_book_copy_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['book', 'status'], name='library_instance_book_status'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_bookinstance_book_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookinstance',
+            name='fees_accrued_until',
+            field=models.DateField(blank=True, null=True, verbose_name='fees accrued until'),
+        ),
+        migrations.AddField(
+            model_name='bookinstance',
+            name='late_fee',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8, verbose_name='late fee'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['status', 'due_back', 'id'], name='library_instance_overdue'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_bookinstance_late_fee'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_sizes',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='cover sizes'),
+        ),
+    ]
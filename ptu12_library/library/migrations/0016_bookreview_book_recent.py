@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_book_cover_sizes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookreview',
+            index=models.Index(fields=['book', '-reviewed_at', 'id'], name='library_review_book_recent'),
+        ),
+    ]
@@ -1,10 +1,11 @@
 from django.contrib.auth import get_user_model
 from datetime import date
-from django.db import models
+from django.db import models, router, transaction
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from tinymce.models import HTMLField
 import uuid
+from . search import normalize_text
 
 User = get_user_model()
 
@@ -24,15 +25,36 @@ class Author(models.Model):
     first_name = models.CharField(_("first name"), max_length=50, db_index=True)
     last_name = models.CharField(_("last name"), max_length=50, db_index=True)
     biography = HTMLField(_("biography"), max_length=8000, blank=True, null=True)
+    search_name = models.CharField(
+        _("search name"),
+        max_length=101,
+        blank=True,
+        default='',
+        editable=False,
+    )
 
     class Meta:
         ordering = ['last_name', 'first_name']
         verbose_name = _("author")
         verbose_name_plural = _("authors")
+        indexes = [
+            models.Index(
+                fields=['search_name'],
+                name='library_author_search_name',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def save(self, *args, **kwargs) -> None:
+        self.search_name = normalize_text(f"{self.first_name} {self.last_name}")
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'search_name' not in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("author_detail", kwargs={"pk": self.pk})
 
@@ -61,15 +83,47 @@ class Book(models.Model):
         null=True, 
         blank=True,
     )
+    # [width, height] of the generated cover variants, see library.covers
+    cover_sizes = models.JSONField(_("cover sizes"), default=list, blank=True, editable=False)
+    search_document = models.TextField(
+        _("search document"),
+        blank=True,
+        default='',
+        editable=False,
+    )
+    available_count = models.PositiveIntegerField(_("available copies"), default=0, editable=False)
+    reserved_count = models.PositiveIntegerField(_("reserved copies"), default=0, editable=False)
+    taken_count = models.PositiveIntegerField(_("taken copies"), default=0, editable=False)
+    unavailable_count = models.PositiveIntegerField(_("unavailable copies"), default=0, editable=False)
+    broken_count = models.PositiveIntegerField(_("broken copies"), default=0, editable=False)
 
     class Meta:
         ordering = ['title']
         verbose_name = _("book")
         verbose_name_plural = _("books")
+        indexes = [
+            models.Index(
+                fields=['title', 'id'],
+                name='library_book_available_title',
+                condition=models.Q(available_count__gt=0),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.author} - {self.title}"
 
+    def save(self, *args, **kwargs) -> None:
+        # the copy counters are moved by UPDATEs of their own (library.counters); a book loaded
+        # before one of its copies changed status must not write the old numbers back
+        if kwargs.get('update_fields') is None and not kwargs.get('force_insert') and not self._state.adding:
+            counters = BookInstance.STATUS_COUNTER_FIELDS.values()
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred and field.attname not in counters
+            ]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("book_detail", kwargs={"pk": self.pk})
 
@@ -77,6 +131,10 @@ class Book(models.Model):
         return ', '.join(genre.name for genre in self.genre.all()[:3])
     display_genre.short_description = _('genre')
 
+    @property
+    def copies_count(self):
+        return sum(getattr(self, field) for field in BookInstance.STATUS_COUNTER_FIELDS.values())
+
 
 class BookInstance(models.Model):
     id = models.UUIDField(_("ID"), primary_key=True, default=uuid.uuid4)
@@ -102,6 +160,14 @@ class BookInstance(models.Model):
         (3, _('Unavailable')),
         (7, _('Broken')),
     )
+    # Book field counting the copies in each status
+    STATUS_COUNTER_FIELDS = {
+        0: 'available_count',
+        1: 'reserved_count',
+        2: 'taken_count',
+        3: 'unavailable_count',
+        7: 'broken_count',
+    }
     
     status = models.PositiveSmallIntegerField(
         _("status"), 
@@ -110,6 +176,24 @@ class BookInstance(models.Model):
         db_index=True
     )
 
+    late_fee = models.DecimalField(_("late fee"), max_digits=8, decimal_places=2, default=0)
+    fees_accrued_until = models.DateField(_("fees accrued until"), null=True, blank=True)
+
+    def save(self, *args, **kwargs) -> None:
+        # copy counters of the book are updated by signals within the same transaction
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+    def mark_returned(self) -> None:
+        """Makes the copy available again; late fees are settled at the desk when it is handed in."""
+        self.status = 0
+        self.reader = None
+        self.due_back = None
+        self.late_fee = 0
+        self.fees_accrued_until = None
+        self.save(update_fields=['status', 'reader', 'due_back', 'late_fee', 'fees_accrued_until'])
+
     @property
     def is_overdue(self):
         if self.due_back and date.today() > self.due_back:
@@ -120,6 +204,10 @@ class BookInstance(models.Model):
         ordering = ['due_back']
         verbose_name = _("book instance")
         verbose_name_plural = _("book instances")
+        indexes = [
+            models.Index(fields=['book', 'status'], name='library_instance_book_status'),
+            models.Index(fields=['status', 'due_back', 'id'], name='library_instance_overdue'),
+        ]
 
     def __str__(self):
         return f"{self.book.title} - {self.get_status_display()}"
@@ -149,6 +237,10 @@ class BookReview(models.Model):
         ordering = ['-reviewed_at']
         verbose_name = _("book review")
         verbose_name_plural = _("book reviews")
+        indexes = [
+            # a book's reviews page by page, newest first, in the keyset paginator's order
+            models.Index(fields=['book', '-reviewed_at', 'id'], name='library_review_book_recent'),
+        ]
 
     def __str__(self):
         return f"{self.reviewed_at}: {self.reviewer}"
@@ -156,3 +248,15 @@ class BookReview(models.Model):
     def get_absolute_url(self):
         return reverse("bookreview_detail", kwargs={"pk": self.pk})
 
+
+
+class DashboardCounter(models.Model):
+    name = models.CharField(_("name"), max_length=50, primary_key=True)
+    value = models.BigIntegerField(_("value"), default=0)
+
+    class Meta:
+        verbose_name = _("dashboard counter")
+        verbose_name_plural = _("dashboard counters")
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -0,0 +1,213 @@
+import base64
+import binascii
+import json
+import operator
+from functools import reduce
+from typing import Any, List, Optional, Sequence, Tuple
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.query import QuerySet
+
+
+def estimate_count(queryset: QuerySet) -> Optional[int]:
+    """Reads the planner's row estimate of an unfiltered Postgres table.
+
+    None when the queryset is filtered, the database has no estimate, or the
+    table is small enough to count exactly.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= getattr(settings, 'LIBRARY_ESTIMATE_COUNT_THRESHOLD', 10000):
+            return row[0]
+    return None
+
+
+class KeysetPage:
+    cursor_mode = True
+    number = None
+
+    def __init__(self, object_list: List[Any], paginator: 'KeysetPaginator',
+                 next_cursor: Optional[str], previous_cursor: Optional[str]):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self.object_list)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginates on the queryset ordering plus a primary key tiebreaker, without OFFSET.
+
+    Pages are addressed by opaque cursors holding the ordering values of the
+    row at the page boundary. Nullable ordering fields sort their NULLs last.
+    The total is not needed; pass `count='exact'` to expose `paginator.count`
+    anyway, or `count='estimate'` for the planner's estimate of large tables,
+    an exact count of small unfiltered ones and no count for filtered ones.
+    """
+    def __init__(self, queryset: QuerySet, per_page: int,
+                 ordering: Optional[Sequence[str]] = None, count: str = 'none'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_mode = count
+        self._estimated = False
+        self.keys = self._resolve_keys(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+
+    def _resolve_keys(self, ordering: Sequence[str]) -> List[Tuple[Any, bool]]:
+        opts = self.queryset.model._meta
+        keys = []
+        for name in ordering:
+            descending = name.startswith('-')
+            field = opts.pk if name.lstrip('-') == 'pk' else opts.get_field(name.lstrip('-'))
+            keys.append((field, descending))
+        if not any(field.primary_key for field, descending in keys):
+            keys.append((opts.pk, False))
+        return keys
+
+    @property
+    def count(self) -> Optional[int]:
+        if not hasattr(self, '_count'):
+            if self.count_mode == 'exact':
+                self._count = self.queryset.count()
+            elif self.count_mode == 'estimate':
+                self._count = estimate_count(self.queryset)
+                self._estimated = self._count is not None
+                if self._count is None and not self.queryset.query.where:
+                    self._count = self.queryset.count()
+            else:
+                self._count = None
+        return self._count
+
+    @property
+    def count_is_estimate(self) -> bool:
+        self.count
+        return self._estimated
+
+    def encode_cursor(self, obj: Any, direction: str) -> str:
+        values = [field.value_to_string(obj) if getattr(obj, field.attname) is not None else None
+                  for field, descending in self.keys]
+        payload = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> Optional[Tuple[str, List[Any]]]:
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(payload)
+            if direction not in ('n', 'p') or len(values) != len(self.keys):
+                return None
+            return direction, [
+                None if value is None else field.to_python(value)
+                for (field, descending), value in zip(self.keys, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+
+    def _ordering(self, backwards: bool) -> List[Any]:
+        ordering = []
+        for field, descending in self.keys:
+            nulls = {}
+            if field.null:
+                nulls = {'nulls_first': True} if backwards else {'nulls_last': True}
+            expression = F(field.attname)
+            ordering.append(expression.desc(**nulls) if descending != backwards else expression.asc(**nulls))
+        return ordering
+
+    def _after(self, values: List[Any], backwards: bool) -> Q:
+        """Rows strictly after (or before, going backwards) the given key values."""
+        terms = []
+        equal = Q()
+        for (field, descending), value in zip(self.keys, values):
+            name = field.attname
+            if value is None:
+                # NULLs sort last: nothing follows them, every non-NULL value precedes them
+                if backwards:
+                    terms.append(equal & Q(**{f"{name}__isnull": False}))
+                equal &= Q(**{f"{name}__isnull": True})
+                continue
+            lookup = 'lt' if descending != backwards else 'gt'
+            strict = Q(**{f"{name}__{lookup}": value})
+            if field.null and not backwards:
+                strict |= Q(**{f"{name}__isnull": True})
+            terms.append(equal & strict)
+            equal &= Q(**{name: value})
+        return reduce(operator.or_, terms) if terms else Q(pk__in=[])
+
+    def _page_queryset(self, cursor: Optional[str]) -> Tuple[QuerySet, Optional[str]]:
+        decoded = self.decode_cursor(cursor) if cursor else None
+        backwards = decoded is not None and decoded[0] == 'p'
+        qs = self.queryset.order_by(*self._ordering(backwards))
+        if decoded is not None:
+            qs = qs.filter(self._after(decoded[1], backwards))
+        return qs[:self.per_page + 1], decoded and decoded[0]
+
+    def _build_page(self, rows: List[Any], direction: Optional[str]) -> KeysetPage:
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'p':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, direction is not None
+        return KeysetPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor(rows[-1], 'n') if rows and has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'p') if rows and has_previous else None,
+        )
+
+    def get_page(self, cursor: Optional[str]) -> KeysetPage:
+        qs, direction = self._page_queryset(cursor)
+        return self._build_page(list(qs), direction)
+
+    async def aget_page(self, cursor: Optional[str]) -> KeysetPage:
+        qs, direction = self._page_queryset(cursor)
+        return self._build_page([obj async for obj in qs], direction)
+
+
+def keyset_enabled(request) -> bool:
+    """Keyset pagination is the default mode; `?page=N` links keep working through OFFSET pagination."""
+    return getattr(settings, 'LIBRARY_PAGINATION', 'keyset') == 'keyset' and 'page' not in request.GET
+
+
+def keyset_count_mode() -> str:
+    return getattr(settings, 'LIBRARY_PAGINATION_COUNT', 'estimate')
+
+
+class KeysetPaginationMixin:
+    """ListView mixin switching to keyset pagination while the default ordering is in use."""
+    def keyset_applicable(self, queryset: QuerySet) -> bool:
+        return keyset_enabled(self.request)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.keyset_applicable(queryset):
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, count=keyset_count_mode())
+        page = paginator.get_page(self.request.GET.get('cursor'))
+        return paginator, page, page.object_list, page.has_other_pages()
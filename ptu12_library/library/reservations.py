@@ -0,0 +1,44 @@
+from datetime import date
+from django.db import connections, router, transaction
+from . import counters
+from . models import Book, BookInstance
+
+
+class NoCopyAvailable(Exception):
+    pass
+
+
+def reserve_copy(book: Book, reader, due_back: date, attempts: int = 10) -> BookInstance:
+    """Atomically claims one available copy of the book for the reader.
+
+    Postgres locks a single available row with SELECT ... FOR UPDATE SKIP
+    LOCKED, so concurrent readers each get a different copy without waiting.
+    Databases without row locks (SQLite serializes writers anyway) claim the
+    copy with a conditional UPDATE and retry when another writer got it first.
+    """
+    using = router.db_for_write(BookInstance)
+    available = BookInstance.objects.using(using).filter(book=book, status=0).order_by()
+    with transaction.atomic(using=using):
+        if connections[using].features.has_select_for_update_skip_locked:
+            copy = available.select_for_update(skip_locked=True).first()
+            if copy is None:
+                raise NoCopyAvailable(book.pk)
+            copy.status = 1
+            copy.reader = reader
+            copy.due_back = due_back
+            copy.save(using=using, update_fields=['status', 'reader', 'due_back'])
+            return copy
+        for attempt in range(attempts):
+            pk = available.values_list('pk', flat=True).first()
+            if pk is None:
+                break
+            claimed = BookInstance.objects.using(using).filter(pk=pk, status=0).update(
+                status=1, reader=reader, due_back=due_back,
+            )
+            if claimed:
+                # the UPDATE bypasses signals, so the counters are moved here
+                counters.bump(instances_available=-claimed)
+                counters.adjust_book_copies(book.pk, 0, -claimed)
+                counters.adjust_book_copies(book.pk, 1, claimed)
+                return BookInstance.objects.using(using).get(pk=pk)
+    raise NoCopyAvailable(book.pk)
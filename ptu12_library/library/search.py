@@ -0,0 +1,158 @@
+import html
+import unicodedata
+from typing import Iterable
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import BooleanField, Case, F, FloatField, Func, IntegerField, Q, Value, When
+from django.db.models.query import QuerySet
+from django.utils.html import strip_tags
+
+SEARCH_CONFIG = 'simple'
+SEARCH_INDEX_NAME = 'library_book_search_gin'
+AUTHOR_TRIGRAM_INDEX_NAME = 'library_author_search_name_trgm'
+# pg_trgm can be installed or dropped while the site runs, so whether it is there is only cached this long
+TRIGRAM_CHECK_SECONDS = 300
+
+
+def normalize_text(text: str | None) -> str:
+    """Lowercases text, strips HTML tags and diacritics and collapses whitespace."""
+    if not text:
+        return ''
+    text = html.unescape(strip_tags(text))
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+def build_search_document(book) -> str:
+    parts = [book.title, book.author.first_name, book.author.last_name]
+    parts.extend(genre.name for genre in book.genre.all())
+    parts.append(book.summary)
+    return normalize_text(' '.join(part for part in parts if part))
+
+
+def update_search_documents(books: QuerySet) -> int:
+    from . models import Book
+    updated = 0
+    batch = []
+    books = books.select_related('author').prefetch_related('genre').order_by()
+    for book in books.iterator(chunk_size=500):
+        document = build_search_document(book)
+        if document != book.search_document:
+            book.search_document = document
+            batch.append(book)
+        if len(batch) >= 500:
+            updated += Book.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    if batch:
+        updated += Book.objects.bulk_update(batch, ['search_document'])
+    return updated
+
+
+def update_books_search_documents(book_ids: Iterable[int]) -> int:
+    from . models import Book
+    return update_search_documents(Book.objects.filter(pk__in=list(book_ids)))
+
+
+class TsMatch(Func):
+    """`to_tsvector(document) @@ websearch_to_tsquery(query)`, matching the GIN index expression."""
+    template = (
+        f"to_tsvector('{SEARCH_CONFIG}'::regconfig, %(document)s) @@ "
+        f"websearch_to_tsquery('{SEARCH_CONFIG}'::regconfig, %(query)s)"
+    )
+    output_field = BooleanField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        document, query = self.source_expressions
+        document_sql, document_params = compiler.compile(document)
+        query_sql, query_params = compiler.compile(query)
+        sql = self.template % {'document': document_sql, 'query': query_sql}
+        return sql, (*document_params, *query_params)
+
+
+class TsRank(TsMatch):
+    template = (
+        f"ts_rank(to_tsvector('{SEARCH_CONFIG}'::regconfig, %(document)s), "
+        f"websearch_to_tsquery('{SEARCH_CONFIG}'::regconfig, %(query)s))"
+    )
+    output_field = FloatField()
+
+
+def search_books(qs: QuerySet, query: str) -> QuerySet:
+    """Filters and ranks books by their precomputed search document.
+
+    Uses the tsvector GIN index on Postgres, falls back to substring matching
+    of normalized terms on other databases.
+    """
+    normalized = normalize_text(query)
+    if not normalized:
+        return qs
+    title_match = Case(
+        When(title__icontains=query, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    if connections[qs.db].vendor == 'postgresql':
+        document, value = F('search_document'), Value(normalized)
+        return qs.filter(TsMatch(document, value)).annotate(
+            title_match=title_match,
+            search_rank=TsRank(document, value),
+        ).order_by('-title_match', '-search_rank', 'title', 'pk')
+    terms = Q()
+    for term in normalized.split():
+        terms &= Q(search_document__contains=term)
+    return qs.filter(terms).annotate(
+        title_match=title_match,
+    ).order_by('-title_match', 'title', 'pk')
+
+
+class TrigramMatch(Func):
+    """`expression % query`, served by the pg_trgm GIN index."""
+    arg_joiner = ' %% '
+    template = '%(expressions)s'
+    output_field = BooleanField()
+
+
+class TrigramSimilarity(Func):
+    function = 'SIMILARITY'
+    output_field = FloatField()
+
+
+def trigram_installed(alias: str) -> bool:
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def trigram_available(alias: str) -> bool:
+    if connections[alias].vendor != 'postgresql':
+        return False
+    return cache.get_or_set(f'library:trigram:{alias}', lambda: trigram_installed(alias), TRIGRAM_CHECK_SECONDS)
+
+
+def search_authors(qs: QuerySet, query: str) -> QuerySet:
+    """Matches authors by their normalized (unaccented, lowercased) full name.
+
+    Prefix and substring hits come first. With pg_trgm installed, similar
+    spellings are matched and ranked by trigram similarity as well.
+    """
+    normalized = normalize_text(query)
+    if not normalized:
+        return qs
+    prefix_match = Case(
+        When(Q(search_name__startswith=normalized) | Q(search_name__contains=f' {normalized}'), then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    condition = Q(search_name__contains=normalized)
+    if trigram_available(qs.db):
+        value = Value(normalized)
+        return qs.filter(
+            condition | Q(TrigramMatch(F('search_name'), value))
+        ).annotate(
+            prefix_match=prefix_match,
+            similarity=TrigramSimilarity(F('search_name'), value),
+        ).order_by('-prefix_match', '-similarity', 'last_name', 'first_name', 'pk')
+    return qs.filter(condition).annotate(
+        prefix_match=prefix_match,
+    ).order_by('-prefix_match', 'last_name', 'first_name', 'pk')
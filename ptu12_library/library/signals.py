@@ -0,0 +1,106 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+from . import counters, covers, fragments
+from . models import Author, Book, BookInstance, Genre
+from . search import update_books_search_documents
+
+
+@receiver(post_save, sender=Book)
+def book_search_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and set(update_fields) <= {'search_document'}):
+        return
+    update_books_search_documents([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genre_search_document(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            update_books_search_documents([instance.pk])
+    elif action == 'pre_clear':
+        instance._cleared_book_pks = list(instance.book_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        update_books_search_documents(getattr(instance, '_cleared_book_pks', []))
+    elif action in ('post_add', 'post_remove'):
+        update_books_search_documents(pk_set)
+
+
+@receiver(post_save, sender=Author)
+def author_search_document(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    update_books_search_documents(instance.books.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Genre)
+def genre_search_document(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    update_books_search_documents(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Book)
+def book_created_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(books=1)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted_counter(sender, instance, **kwargs):
+    counters.bump(books=-1)
+
+
+@receiver(post_save, sender=Author)
+def author_created_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(authors=1)
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted_counter(sender, instance, **kwargs):
+    counters.bump(authors=-1)
+
+
+@receiver(post_save, sender=Book)
+def book_fragments(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and set(update_fields) <= {'search_document'}):
+        return
+    fragments.bump(instance.pk)
+
+
+@receiver(post_init, sender=BookInstance)
+def remember_instance_state(sender, instance, **kwargs):
+    # deferred fields are left alone, reading them here would cost a query
+    instance._initial_book_id = instance.__dict__.get('book_id')
+    instance._initial_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=BookInstance)
+def instance_saved_counters(sender, instance, created, raw=False, **kwargs):
+    previous_book_id, previous_status = instance._initial_book_id, instance._initial_status
+    instance._initial_book_id, instance._initial_status = instance.book_id, instance.status
+    if raw:
+        return
+    # the due date or the copy itself may change without moving a counter
+    fragments.bump(*filter(None, (previous_book_id, instance.book_id)))
+    if created:
+        counters.bump(instances=1, instances_available=int(instance.status == 0))
+        counters.adjust_book_copies(instance.book_id, instance.status, 1)
+        return
+    if previous_status is None or previous_book_id is None:
+        # loaded with deferred fields, the previous state is unknown
+        return
+    if (previous_status == 0) != (instance.status == 0):
+        counters.bump(instances_available=1 if instance.status == 0 else -1)
+    if (previous_book_id, previous_status) != (instance.book_id, instance.status):
+        counters.adjust_book_copies(previous_book_id, previous_status, -1)
+        counters.adjust_book_copies(instance.book_id, instance.status, 1)
+
+
+@receiver(post_delete, sender=BookInstance)
+def instance_deleted_counters(sender, instance, **kwargs):
+    counters.bump(instances=-1, instances_available=-int(instance.status == 0))
+    counters.adjust_book_copies(instance.book_id, instance.status, -1)
+
+
+covers.cover_variants.connect(Book)
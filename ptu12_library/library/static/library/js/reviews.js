@@ -0,0 +1,52 @@
+// Loads further review pages in place and posts reviews without reloading the book page.
+(function () {
+    const headers = {'X-Requested-With': 'XMLHttpRequest'};
+    const list = document.querySelector('ul.review-list');
+    if (!list) {
+        return;
+    }
+
+    list.addEventListener('click', function (event) {
+        const link = event.target.closest('[data-load-more]');
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        fetch(link.href, {headers: headers})
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.text();
+            })
+            .then(function (html) {
+                const item = link.closest('li');
+                item.insertAdjacentHTML('afterend', html);
+                item.remove();
+            })
+            .catch(function () {
+                window.location = link.href;
+            });
+    });
+
+    const form = document.querySelector('form.review-form');
+    if (!form) {
+        return;
+    }
+    form.addEventListener('submit', function (event) {
+        event.preventDefault();
+        fetch(form.action, {method: 'POST', body: new FormData(form), headers: headers})
+            .then(function (response) {
+                if (response.status === 201) {
+                    return response.text().then(function (html) {
+                        list.insertAdjacentHTML('afterbegin', html);
+                        form.querySelector('textarea').value = '';
+                    });
+                }
+                form.submit();
+            })
+            .catch(function () {
+                form.submit();
+            });
+    });
+})();
@@ -0,0 +1,88 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from django.utils import translation
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from .. covers import DEFAULT_COVER_SIZE, variant_name
+from .. fragments import get_or_render
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def querystring(context, **kwargs):
+    """Current query string without pagination parameters, updated with the given ones."""
+    params = context['request'].GET.copy()
+    for key in ('page', 'cursor'):
+        params.pop(key, None)
+    for key, value in kwargs.items():
+        if value is None:
+            params.pop(key, None)
+        else:
+            params[key] = value
+    return f"?{params.urlencode()}"
+
+
+@register.simple_tag
+def cover_image(book, sizes: str = '100vw', loading: str = 'lazy'):
+    """The book cover as a <picture> with WebP and JPEG variants, falling back to the original upload."""
+    if not book.cover:
+        width, height = DEFAULT_COVER_SIZE
+        return format_html(
+            '<img class="book-cover" src="{}" width="{}" height="{}" alt="" loading="{}">',
+            static('library/img/default_cover.jpg'), width, height, loading,
+        )
+    if not book.cover_sizes:
+        # variants are not generated yet
+        return format_html('<img class="book-cover" src="{}" alt="" loading="{}">', book.cover.url, loading)
+
+    def srcset(extension):
+        return ', '.join(
+            f"{default_storage.url(variant_name(book.cover.name, width, extension))} {width}w"
+            for width, height in book.cover_sizes
+        )
+    # the middle variant is the plain src and sets the aspect ratio
+    width, height = book.cover_sizes[len(book.cover_sizes) // 2]
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img class="book-cover" src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="" '
+        'loading="{}" decoding="async"></picture>',
+        srcset('webp'), sizes,
+        default_storage.url(variant_name(book.cover.name, width, 'jpg')), srcset('jpg'), sizes, width, height,
+        loading,
+    )
+
+
+class BookFragmentNode(template.Node):
+    def __init__(self, nodelist, name, book, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.book = book
+        self.vary = vary
+
+    def render(self, context):
+        vary = [translation.get_language() or ''] + [str(value.resolve(context)) for value in self.vary]
+        return mark_safe(get_or_render(
+            self.book.resolve(context).pk, self.name.resolve(context), vary,
+            lambda: self.nodelist.render(context),
+        ))
+
+
+@register.tag
+def bookfragment(parser, token):
+    """Caches the enclosed part of a book's page until the book or its copies change.
+
+        {% bookfragment 'copies' book [vary_on ...] %} ... {% endbookfragment %}
+
+    See library.fragments for the versioned keys and the render lock.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and a book")
+    nodelist = parser.parse(('endbookfragment',))
+    parser.delete_first_token()
+    return BookFragmentNode(
+        nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
@@ -1,3 +1,1019 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse
+from django.core.management import call_command
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.shortcuts import render
+from django.urls import reverse
+from PIL import Image
+from django.core.files.storage import FileSystemStorage
+from django.core.exceptions import MiddlewareNotUsed
+from ptu12_library import health, media, metrics, profiling, warmup
+from ptu12_library.images import variant_queue
+from ptu12_library.storage import CompressedManifestStaticFilesStorage
+from ptu12_library.db_router import STICKY_COOKIE, PrimaryReplicaRouter, use_primary
+from . import async_views, checks, counters, fragments
+from . covers import variant_name
+from . models import Author, Book, BookInstance, BookReview, DashboardCounter, Genre
+from . jobs import sweep_overdue
+from . pagination import KeysetPaginator
+from . reservations import reserve_copy
+from . search import search_authors, search_books, trigram_available
 
-# Create your tests here.
+User = get_user_model()
+
+
+class QueryBudgetMixin:
+    """Asserts that a page runs at most `budget` queries, independently of how much data it shows."""
+
+    def assertQueryBudget(self, url: str, budget: int, method: str = 'get', data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400, url)
+        executed = len(context.captured_queries)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(
+            executed, budget,
+            f"{url} ran {executed} queries, budget is {budget}:\n{queries}",
+        )
+        return executed
+
+
+def create_catalog(books: int, copies: int, reviews: int, reader=None):
+    genres = [Genre.objects.create(name=f"Genre {i}") for i in range(3)]
+    author = Author.objects.create(first_name='Jonas', last_name='Biliūnas')
+    created = []
+    for i in range(books):
+        book = Book.objects.create(title=f"Book {i:03}", summary='<p>summary</p>', author=author)
+        book.genre.set(genres)
+        for j in range(copies):
+            BookInstance.objects.create(
+                book=book,
+                status=j % 3,
+                reader=reader if j % 3 else None,
+                due_back=date.today() + timedelta(days=j - 1) if j % 3 else None,
+            )
+        for j in range(reviews):
+            BookReview.objects.create(book=book, reviewer=reader, content=f"review {j}")
+        created.append(book)
+    return author, created
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    # url name -> maximum number of queries the page may run
+    BUDGETS = {
+        'index': 6,
+        'author_list': 4,
+        'author_detail': 4,
+        'book_list': 4,
+        'book_detail': 6,
+        'user_book_instances': 4,
+        'bookinstance_update': 4,
+        'bookinstance_return': 4,
+    }
+
+    def measure(self, books: int, copies: int, reviews: int) -> dict:
+        reader = User.objects.create_user(f"reader{books}", password='secret-pass')
+        author, catalog = create_catalog(books, copies, reviews, reader=reader)
+        cache.clear()
+        self.client.force_login(reader)
+        book = catalog[0]
+        copy = book.instances.filter(reader=reader).first()
+        urls = {
+            'index': reverse('index'),
+            'author_list': reverse('author_list'),
+            'author_detail': reverse('author_detail', kwargs={'pk': author.pk}),
+            'book_list': reverse('book_list'),
+            'book_detail': reverse('book_detail', kwargs={'pk': book.pk}),
+            'user_book_instances': reverse('user_book_instances'),
+            'bookinstance_update': reverse('bookinstance_update', kwargs={'pk': copy.pk}),
+            'bookinstance_return': reverse('bookinstance_return', kwargs={'pk': copy.pk}),
+        }
+        return {
+            name: self.assertQueryBudget(url, self.BUDGETS[name])
+            for name, url in urls.items()
+        }
+
+    def test_query_count_does_not_grow_with_data(self):
+        small = self.measure(books=2, copies=2, reviews=1)
+        large = self.measure(books=12, copies=9, reviews=15)
+        self.assertEqual(small, large)
+
+    def test_api_query_count_does_not_grow_with_data(self):
+        url = reverse('api_list', kwargs={'resource': 'books'}) + '?fields=id,title,author,genres,copies,reviews'
+        create_catalog(2, 2, 1, reader=User.objects.create_user('small'))
+        small = self.assertQueryBudget(url, 4)
+        create_catalog(20, 5, 5, reader=User.objects.create_user('large'))
+        self.assertEqual(self.assertQueryBudget(url, 4), small)
+
+    def test_review_post_budget(self):
+        reader = User.objects.create_user('poster', password='secret-pass')
+        author, catalog = create_catalog(1, 5, 5, reader=reader)
+        self.client.force_login(reader)
+        book = catalog[0]
+        self.assertQueryBudget(
+            reverse('book_detail', kwargs={'pk': book.pk}),
+            11,
+            method='post',
+            data={'content': 'Great!', 'book': book.pk, 'reviewer': reader.pk},
+        )
+        self.assertEqual(book.reviews.count(), 6)
+
+
+class ReviewPaginationTests(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user('recenzentas', password='secret-pass')
+        author, catalog = create_catalog(1, 1, 25, reader=self.reader)
+        self.book = catalog[0]
+
+    def test_reviews_load_page_by_page(self):
+        response = self.client.get(reverse('book_detail', kwargs={'pk': self.book.pk}))
+        self.assertContains(response, 'review 24')
+        self.assertNotContains(response, 'review 14<')
+        self.assertContains(response, 'data-load-more')
+
+        url = reverse('book_reviews', kwargs={'pk': self.book.pk})
+        seen = []
+        while url:
+            response = self.client.get(url, {'format': 'json'} if '?' not in url else None)
+            data = response.json()
+            seen.extend(review['content'] for review in data['results'])
+            url = data['next']
+        self.assertCountEqual(seen, [f"review {i}" for i in range(25)])
+        self.assertEqual(self.client.get(reverse('book_reviews', kwargs={'pk': 0})).status_code, 404)
+
+    def test_ajax_post_returns_the_new_review(self):
+        self.client.force_login(self.reader)
+        response = self.client.post(
+            reverse('book_detail', kwargs={'pk': self.book.pk}),
+            {'content': 'Puiki knyga', 'book': self.book.pk, 'reviewer': self.reader.pk},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertContains(response, 'Puiki knyga', status_code=201)
+        self.assertNotContains(response, '<html', status_code=201)
+        response = self.client.post(
+            reverse('book_detail', kwargs={'pk': self.book.pk}),
+            {'content': '', 'book': self.book.pk, 'reviewer': self.reader.pk},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('content', response.json()['errors'])
+
+
+class AsyncViewTests(TestCase):
+    def request(self, path: str, **params):
+        request = AsyncRequestFactory().get(path, params)
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        return request
+
+    async def test_async_catalog_pages(self):
+        reader = await User.objects.acreate(username='reader')
+        author, catalog = await sync_to_async(create_catalog)(books=8, copies=2, reviews=2, reader=reader)
+        response = await async_views.index(self.request('/'))
+        self.assertContains(response, '8')
+        response = await async_views.author_list(self.request('/authors/'))
+        self.assertContains(response, 'Biliūnas')
+        response = await async_views.author_detail(self.request('/author/'), pk=author.pk)
+        self.assertContains(response, 'Book 007')
+
+        response = await async_views.book_list(self.request('/books/'))
+        self.assertContains(response, 'Book 005')
+        self.assertNotContains(response, 'Book 006')
+        page = await KeysetPaginator(Book.objects.all(), 6).aget_page(None)
+        response = await async_views.book_list(self.request('/books/', cursor=page.next_cursor))
+        self.assertContains(response, 'Book 006')
+        response = await async_views.book_list(self.request('/books/', query='book 003'))
+        self.assertContains(response, 'Book 003')
+
+        response = await async_views.book_detail(self.request('/book/'), pk=catalog[0].pk)
+        self.assertContains(response, 'review 1')
+        with self.assertRaises(Http404):
+            await async_views.book_detail(self.request('/book/'), pk=0)
+
+
+class WriteFreeIndexTests(TestCase):
+    def test_anonymous_index_writes_nothing(self):
+        for expected in (1, 2, 3):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('index'))
+            self.assertEqual(response.context['num_visits'], expected)
+            writes = [query['sql'] for query in context.captured_queries
+                      if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+            self.assertEqual(writes, [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+        self.client.cookies['num_visits'] = 'forged'
+        self.assertEqual(self.client.get(reverse('index')).context['num_visits'], 1)
+
+    def test_expired_sessions_are_cleared_in_batches(self):
+        for i in range(5):
+            store = SessionStore()
+            store['i'] = i
+            store.set_expiry(-1 if i < 4 else 3600)
+            store.save()
+        out = StringIO()
+        call_command('clear_expired_sessions', batch_size=2, stdout=out)
+        self.assertIn('4 expired sessions deleted', out.getvalue())
+        self.assertEqual(SessionStore.get_model_class().objects.count(), 1)
+
+
+class HealthTests(TestCase):
+    def setUp(self):
+        health._last_ping['checked_at'] = 0.0
+
+    def test_liveness_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/healthz')
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_readiness_ping_is_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/readyz').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/readyz').status_code, 200)
+
+    @override_settings(HEALTH_CHECK_CACHE_SECONDS=0)
+    def test_readiness_reports_database_errors(self):
+        with mock.patch.object(health, 'ping_database', return_value=False):
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['database'])
+
+
+class MediaDeliveryTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name, MEDIA_ACCEL_REDIRECT='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for folder in ('library/book_covers', 'user_profile/pictures', 'private'):
+            Path(directory.name, folder).mkdir(parents=True)
+        Path(directory.name, 'library/book_covers/cover.jpg').write_bytes(b'0123456789')
+        Path(directory.name, 'user_profile/pictures/avatars').mkdir()
+        Path(directory.name, 'user_profile/pictures/me.jpg').write_bytes(b'me')
+        for size in (16, 32, 300):
+            Path(directory.name, f'user_profile/pictures/avatars/me_{size}.jpg').write_bytes(b'me')
+        Path(directory.name, 'private/notes.txt').write_bytes(b'secret')
+
+    def test_cover_is_sent_with_validators(self):
+        response = self.client.get('/media/library/book_covers/cover.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('public', response['Cache-Control'])
+        again = self.client.get('/media/library/book_covers/cover.jpg', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_byte_ranges(self):
+        url = '/media/library/book_covers/cover.jpg'
+        response = self.client.get(url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 2-5/10', '4'))
+        response = self.client.get(url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=10-').status_code, 416)
+        # a stale If-Range gets the whole, current file
+        response = self.client.get(url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(media.parse_range('bytes=0-1,4-5', 10), None)
+        self.assertEqual(media.parse_range('bytes=5-100', 10), (5, 9))
+
+    def test_profile_pictures_need_a_login(self):
+        url = '/media/user_profile/pictures/me.jpg'
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user('reader'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_review_avatars_are_public(self):
+        for size in (16, 32):
+            response = self.client.get(f'/media/user_profile/pictures/avatars/me_{size}.jpg')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('public', response['Cache-Control'])
+        self.assertEqual(self.client.get('/media/user_profile/pictures/avatars/me_300.jpg').status_code, 403)
+
+    def test_unlisted_and_escaping_paths_are_not_served(self):
+        for url in ('/media/private/notes.txt', '/media/library/book_covers/../../private/notes.txt',
+                    '/media/library/book_covers/missing.jpg', '/media/library/book_covers/'):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_nginx_sends_the_file(self):
+        with override_settings(MEDIA_ACCEL_REDIRECT='/protected-media/'), self.assertNumQueries(0):
+            response = self.client.get('/media/library/book_covers/cover.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/library/book_covers/cover.jpg')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+
+PROFILED_TEMPLATES = [dict(settings.TEMPLATES[0], BACKEND='ptu12_library.profiling.ProfiledDjangoTemplates')]
+
+
+class ProfilingTests(TestCase):
+    def test_disabled_middleware_leaves_the_chain(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(lambda request: None)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('healthz')))
+
+    async def test_async_chain(self):
+        async def view(request):
+            await Book.objects.acount()
+            return await sync_to_async(render)(request, 'library/index.html', {})
+        with override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_SLOW_MS=10 ** 6, TEMPLATES=PROFILED_TEMPLATES):
+            middleware = profiling.ProfilingMiddleware(view)
+            self.assertTrue(iscoroutinefunction(middleware))
+            request = AsyncRequestFactory().get('/')
+            request.user = AnonymousUser()
+            response = await middleware(request)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="1 queries, 0 repeated", tpl;dur=(?!0\.0,)')
+
+    def test_slow_requests_are_timed_logged_and_summarized(self):
+        author, (book,) = create_catalog(1, 3, 2)
+        log = Path(tempfile.mkdtemp()) / 'slow.jsonl'
+        self.addCleanup(log.parent.rmdir)
+        self.addCleanup(log.unlink)
+        with override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_SLOW_MS=0, REQUEST_PROFILING_LOG=log,
+                               TEMPLATES=PROFILED_TEMPLATES):
+            response = self.client.get(reverse('book_detail', args=[book.pk]))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries, \d+ repeated", tpl;dur=')
+        entry, = profiling.read_log_entries(log)
+        self.assertEqual((entry['url_name'], entry['status']), ('book_detail', 200))
+        self.assertGreater(entry['queries'], 0)
+        self.assertGreater(entry['template_ms'], 0)
+        self.assertLessEqual(entry['template_ms'], entry['view_ms'])
+        output = StringIO()
+        call_command('summarize_profiles', log=str(log), stdout=output)
+        self.assertIn('book_detail', output.getvalue())
+
+    def test_repeated_queries_are_detected(self):
+        profile = profiling.RequestProfile()
+        profile.queries = [('default', 'SELECT 1 WHERE id = %s', 0.001)] * 3 + [('default', 'SELECT 2', 0.001)]
+        self.assertEqual(profile.repeated_queries(), {'SELECT 1 WHERE id = %s': 3})
+        self.assertEqual(profile.top_queries(1)[0]['count'], 3)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(METRICS_DIR=directory.name, METRICS_FLUSH_SECONDS=60)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics.registry.reset()
+        cache.clear()
+
+    def test_endpoint_is_off_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_requests_are_counted_per_url_name_across_workers(self):
+        author, (book,) = create_catalog(1, 3, 0)
+        BookInstance.objects.filter(book=book, status=2).update(due_back=date.today() - timedelta(days=3))
+        # another worker's samples
+        other = metrics.Registry()
+        other.inc('ptu12_http_requests_total', url_name='book_list', method='GET', status='200')
+        other.observe('ptu12_http_request_duration_seconds', 0.2, url_name='book_list')
+        metrics.write_json(self.directory / 'worker-1.json', other.snapshot())
+        with override_settings(METRICS_ENABLED=True):
+            self.client.get(reverse('book_list'))
+            self.client.get(reverse('book_list'))
+            self.client.get('/no-such-page/')
+            text = self.client.get('/metrics').content.decode()
+        self.assertIn('ptu12_http_requests_total{method="GET",status="200",url_name="book_list"} 3', text)
+        self.assertIn('ptu12_http_requests_total{method="GET",status="404",url_name="unmatched"} 1', text)
+        self.assertIn('ptu12_http_request_duration_seconds_bucket{url_name="book_list",le="+Inf"} 3', text)
+        self.assertIn('ptu12_http_request_duration_seconds_count{url_name="book_list"} 3', text)
+        self.assertRegex(text, r'ptu12_db_queries_total\{url_name="book_list"\} \d+')
+        self.assertIn('ptu12_book_copies{status="available"} 1', text)
+        self.assertIn('ptu12_overdue_loans 1', text)
+
+    @override_settings(METRICS_ENABLED=True, CACHES={'default': {'BACKEND': 'ptu12_library.metrics.CountingLocMemCache'}})
+    def test_counting_cache_backend(self):
+        cache.set('present', 1)
+        self.assertEqual(cache.get('present'), 1)
+        self.assertEqual(cache.get('absent', 'default'), 'default')
+        text = self.client.get('/metrics').content.decode()
+        # the endpoint's own gauge lookups are not counted
+        self.assertIn('ptu12_cache_requests_total{backend="locmem",result="hit"} 1', text)
+        self.assertIn('ptu12_cache_requests_total{backend="locmem",result="miss"} 1', text)
+        self.assertIn('ptu12_cache_hit_ratio{backend="locmem"} 0.5', text)
+
+    def test_default_cache_backend_is_not_counted(self):
+        with override_settings(METRICS_ENABLED=True):
+            cache.get('absent')
+        self.assertEqual(metrics.registry.snapshot()['counters'], {})
+
+    async def test_async_chain(self):
+        async def view(request):
+            await Book.objects.acount()
+            return HttpResponse()
+        with override_settings(METRICS_ENABLED=True):
+            middleware = metrics.MetricsMiddleware(view)
+            self.assertTrue(iscoroutinefunction(middleware))
+            request = AsyncRequestFactory().get('/')
+            response = await middleware(request)
+        self.assertEqual(response.status_code, 200)
+        counters = metrics.registry.snapshot()['counters']
+        self.assertEqual(counters[metrics.key('ptu12_db_queries_total', url_name='unmatched')], 1)
+
+    def test_exited_workers_are_archived(self):
+        other = metrics.Registry()
+        other.inc('ptu12_db_queries_total', 4, url_name='index')
+        metrics.write_json(self.directory / 'worker-99999.json', other.snapshot())
+        metrics.mark_process_dead(self.directory, 99999)
+        self.assertFalse((self.directory / 'worker-99999.json').exists())
+        metrics.mark_process_dead(self.directory, 99999)
+        expected = {metrics.key('ptu12_db_queries_total', url_name='index'): 4}
+        self.assertEqual(metrics.collect()['counters'], expected)
+        self.assertEqual(list(self.directory.glob('exited-*.json')), [])
+        self.assertTrue((self.directory / 'archive.json').exists())
+        self.assertEqual(metrics.collect()['counters'], expected)
+
+    def test_worker_exiting_during_collect_is_counted_once(self):
+        other = metrics.Registry()
+        other.inc('ptu12_db_queries_total', 4, url_name='index')
+        metrics.write_json(self.directory / 'worker-99999.json', other.snapshot())
+        read_text = Path.read_text
+
+        def exit_first(path):
+            if path.name == 'worker-99999.json':
+                metrics.mark_process_dead(self.directory, 99999)
+            return read_text(path)
+
+        with mock.patch.object(Path, 'read_text', exit_first):
+            counters = metrics.collect()['counters']
+        self.assertEqual(counters[metrics.key('ptu12_db_queries_total', url_name='index')], 4)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+    def test_routing_decisions(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Book), 'replica1')
+        self.assertEqual(router.db_for_read(User), 'default')
+        self.assertEqual(router.db_for_write(Book), 'default')
+        with use_primary():
+            self.assertEqual(router.db_for_read(Book), 'default')
+        self.assertEqual(router.db_for_read(Book), 'replica1')
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(router.db_for_read(Book), 'default')
+
+
+def separate_replica() -> bool:
+    # settings.py adds replica1 as a database of its own under manage.py test; a mirror of the
+    # primary (DJANGO_DB_REPLICA_HOSTS set) shows the primary's rows and cannot be told apart
+    replica = settings.DATABASES.get('replica1')
+    return replica is not None and not replica.get('TEST', {}).get('MIRROR')
+
+
+@skipUnless(separate_replica(), 'needs a replica1 database separate from the primary')
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # evaluated when the suite is set up, before the skip, so it may only name existing aliases
+    databases = {'default'} | ({'replica1'} & set(settings.DATABASES))
+
+    def test_reads_follow_the_replica_until_the_user_writes(self):
+        Author.objects.using('default').create(first_name='Pirminis', last_name='Autorius')
+        Author.objects.using('replica1').create(first_name='Kopijos', last_name='Autorius')
+        reader = User.objects.create_user('skaitytojas', password='secret-pass')
+        self.client.force_login(reader)
+
+        response = self.client.get(reverse('author_list'))
+        self.assertContains(response, 'Kopijos')
+        self.assertNotContains(response, 'Pirminis')
+
+        # any write pins the user's next requests to the primary for a while
+        response = self.client.post(reverse('set_language'), {'language': 'en', 'next': '/'})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        response = self.client.get(reverse('author_list'))
+        self.assertContains(response, 'Pirminis')
+
+        del self.client.cookies[STICKY_COOKIE]
+        self.assertContains(self.client.get(reverse('author_list')), 'Kopijos')
+        # the user's own loans always come from the primary
+        book = Book.objects.using('default').create(title='Tik pirminėje', summary='', author=Author.objects.using('default').get())
+        BookInstance.objects.create(book=book, status=1, reader=reader, due_back=date.today())
+        self.assertContains(self.client.get(reverse('user_book_instances')), 'Tik pirminėje')
+
+
+class WarmupTests(TestCase):
+    def test_warm_up_compiles_templates_and_touches_the_database(self):
+        self.assertGreater(warmup.compile_templates(), 10)
+        self.assertGreater(warmup.resolve_urls(), 5)
+        timings = warmup.warm_up()
+        self.assertIn('touch_querysets', timings)
+
+    def test_preloaded_workers_only_touch_the_database(self):
+        self.assertEqual(list(warmup.warm_up(application=False)), ['touch_querysets'])
+
+
+class StaticFilesTests(SimpleTestCase):
+    def test_collectstatic_writes_hashed_and_compressed_copies(self):
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as target:
+            Path(source, 'css').mkdir()
+            Path(source, 'css', 'site.css').write_text('body { background: url("../logo.png"); }\n' * 50)
+            Path(source, 'logo.png').write_bytes(b'png')
+            source_storage = FileSystemStorage(location=source)
+            storage = CompressedManifestStaticFilesStorage(location=target, base_url='/static/')
+            paths = {}
+            for name in ('css/site.css', 'logo.png'):
+                storage.save(name, source_storage.open(name))
+                paths[name] = (source_storage, name)
+            list(storage.post_process(paths))
+            hashed = storage.stored_name('css/site.css')
+            self.assertRegex(hashed, r'^css/site\.[0-9a-f]{12}\.css$')
+            content = Path(target, hashed).read_bytes()
+            self.assertIn(storage.stored_name('logo.png').encode(), content)
+            self.assertEqual(gzip.decompress(Path(target, hashed + '.gz').read_bytes()), content)
+            self.assertTrue(Path(target, 'css', 'site.css.gz').exists())
+            # too small to be worth compressing, and not compressible anyway
+            self.assertFalse(Path(target, storage.stored_name('logo.png') + '.gz').exists())
+
+    def test_templates_reference_only_existing_static_files(self):
+        self.assertEqual(checks.check_static_references(), [])
+
+    def test_hard_coded_and_missing_assets_are_reported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, 'page.html').write_text(
+                '{% load static %}\n'
+                '<link rel="stylesheet" href="/static/css/style.css">\n'
+                '<img src="{{ STATIC_URL }}library/img/default_cover.jpg">\n'
+                '<script src="{% static \'library/js/missing.js\' %}"></script>\n'
+            )
+            engine = dict(settings.TEMPLATES[0], DIRS=[directory])
+            with override_settings(TEMPLATES=[engine]):
+                errors = checks.check_static_references()
+        self.assertEqual([error.id for error in errors], ['library.E001', 'library.E001', 'library.E002'])
+        self.assertIn('line 4', errors[2].msg)
+
+
+class DashboardCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_follow_changes(self):
+        author, catalog = create_catalog(2, 3, 0)
+        copy = catalog[0].instances.filter(status=0).first()
+        copy.status = 2
+        copy.save()
+        catalog[1].delete()
+        cache.clear()
+        self.assertEqual(counters.get_counters(), counters.count_totals())
+
+    def test_book_copy_counters_follow_changes(self):
+        author, (first, second) = create_catalog(2, 4, 0)
+        copy = first.instances.filter(status=0).first()
+        copy.status = 7
+        copy.save()
+        copy.book = second
+        copy.save()
+        first.instances.filter(status=1).first().delete()
+        self.assertEqual(counters.reconcile_book_copies(), 0)
+        stored = dict(DashboardCounter.objects.values_list('name', 'value'))
+        self.assertEqual(stored, counters.count_totals())
+        second.refresh_from_db()
+        self.assertEqual((second.available_count, second.broken_count, second.copies_count), (2, 1, 5))
+        first.instances.filter(status=0).delete()
+        self.assertEqual(
+            list(Book.objects.filter(available_count__gt=0).values_list('title', flat=True)),
+            ['Book 001'],
+        )
+
+    def test_drifted_copy_counters_do_not_fail_saves(self):
+        author, (book,) = create_catalog(1, 3, 0)
+        Book.objects.filter(pk=book.pk).update(available_count=0)
+        book.instances.filter(status=0).first().delete()
+        book.refresh_from_db()
+        self.assertEqual(book.available_count, 0)
+        counters.reconcile_book_copies()
+        book.refresh_from_db()
+        self.assertEqual(book.available_count, book.instances.filter(status=0).count())
+
+    def test_index_runs_no_aggregate_queries(self):
+        create_catalog(1, 2, 0)
+        counters.get_counters()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('index'))
+        self.assertFalse([q for q in context.captured_queries if 'COUNT(' in q['sql']])
+
+
+class KeysetPaginatorTests(TestCase):
+    def walk(self, queryset, per_page):
+        paginator = KeysetPaginator(queryset, per_page)
+        page = paginator.get_page(None)
+        forward = list(page)
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            forward.extend(page)
+        backward = list(page)
+        while page.has_previous():
+            page = paginator.get_page(page.previous_cursor)
+            backward = list(page) + backward
+        return forward, backward
+
+    def test_walks_nullable_ordering_both_ways(self):
+        create_catalog(3, 7, 0, reader=User.objects.create_user('reader'))
+        BookInstance.objects.filter(status=1).update(due_back=date.today())
+        expected = [copy.pk for copy in BookInstance.objects.order_by(
+            F('due_back').asc(nulls_last=True), 'pk')]
+        forward, backward = self.walk(BookInstance.objects.all(), 4)
+        self.assertEqual([copy.pk for copy in forward], expected)
+        self.assertEqual([copy.pk for copy in backward], expected)
+
+    def test_invalid_cursor_returns_first_page(self):
+        create_catalog(3, 0, 0)
+        page = KeysetPaginator(Book.objects.all(), 2).get_page('not-a-cursor')
+        self.assertEqual([book.title for book in page], ['Book 000', 'Book 001'])
+        self.assertFalse(page.has_previous())
+
+    def test_estimate_mode_does_not_count_filtered_querysets(self):
+        create_catalog(3, 0, 0)
+        paginator = KeysetPaginator(Book.objects.filter(title__startswith='Book'), 2, count='estimate')
+        with CaptureQueriesContext(connection) as context:
+            self.assertIsNone(paginator.count)
+        self.assertFalse(context.captured_queries)
+        self.assertFalse(paginator.count_is_estimate)
+
+    def test_estimate_mode_counts_small_tables_exactly(self):
+        create_catalog(3, 0, 0)
+        paginator = KeysetPaginator(Book.objects.all(), 2, count='estimate')
+        self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.count_is_estimate)
+
+
+class BookFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author, (self.book,) = create_catalog(1, 1, 0)
+        self.url = reverse('book_detail', kwargs={'pk': self.book.pk})
+
+    def test_cached_copies_skip_the_query(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'book-status-0')
+        self.assertFalse([query for query in context.captured_queries if 'library_bookinstance' in query['sql']])
+
+    def test_copy_change_retires_the_fragment(self):
+        self.assertContains(self.client.get(self.url), '1 of 1 copies available')
+        copy = self.book.instances.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            copy.status = 7
+            copy.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, '0 of 1 copies available')
+        self.assertContains(response, 'Broken')
+
+    def test_version_survives_an_evicted_key(self):
+        version = fragments.book_version(self.book.pk)
+        fragments.bump_now([self.book.pk])
+        self.assertEqual(fragments.book_version(self.book.pk), version + 1)
+        cache.delete(fragments.VERSION_KEY % self.book.pk)
+        self.assertNotIn(fragments.book_version(self.book.pk), (version, version + 1))
+
+    def test_waits_for_the_render_in_progress(self):
+        key = fragments.FRAGMENT_KEY % (self.book.pk, fragments.book_version(self.book.pk), 'copies', 'en')
+        cache.add(key + ':lock', 1)
+        render = mock.Mock(return_value='rendered here')
+        with mock.patch('library.fragments.time.sleep', side_effect=lambda seconds: cache.set(key, 'rendered')):
+            self.assertEqual(fragments.get_or_render(self.book.pk, 'copies', ['en'], render), 'rendered')
+        render.assert_not_called()
+
+        cache.delete(key)
+        with mock.patch.object(fragments, 'LOCK_WAIT_SECONDS', 0):
+            self.assertEqual(fragments.get_or_render(self.book.pk, 'copies', ['en'], render), 'rendered here')
+        # the lock holder stores the result, the request that gave up waiting does not
+        self.assertIsNone(cache.get(key))
+
+
+class BookCounterTests(TestCase):
+    def test_saving_a_stale_book_keeps_the_copy_counters(self):
+        author, (book,) = create_catalog(1, 1, 0)
+        stale = Book.objects.get(pk=book.pk)
+        self.assertEqual(stale.available_count, 1)
+        copy = book.instances.get()
+        copy.status = 2
+        copy.save()
+        stale.title = 'Anykščių šilelis'
+        stale.save()
+        book.refresh_from_db()
+        self.assertEqual(book.title, 'Anykščių šilelis')
+        self.assertEqual((book.available_count, book.taken_count), (0, 1))
+
+
+class ReturnTests(TestCase):
+    def test_returned_copy_can_be_reserved_again(self):
+        reader = User.objects.create_user('reader', password='secret-pass')
+        author, (book,) = create_catalog(1, 1, 0)
+        copy = reserve_copy(book, reader, date.today() - timedelta(days=3))
+        BookInstance.objects.filter(pk=copy.pk).update(late_fee=Decimal('1.50'), fees_accrued_until=date.today())
+        book.refresh_from_db()
+        self.assertEqual(book.available_count, 0)
+        self.client.force_login(reader)
+        response = self.client.post(reverse('bookinstance_return', kwargs={'pk': copy.pk}))
+        self.assertRedirects(response, reverse('user_book_instances'))
+        copy.refresh_from_db()
+        self.assertEqual((copy.status, copy.reader, copy.due_back, copy.late_fee, copy.fees_accrued_until),
+                         (0, None, None, 0, None))
+        book.refresh_from_db()
+        self.assertEqual((book.available_count, book.reserved_count), (1, 0))
+        self.assertEqual(reserve_copy(book, User.objects.create_user('next'), date.today()).pk, copy.pk)
+
+
+class ReservationStressTests(TransactionTestCase):
+    def test_parallel_reservations_never_share_a_copy(self):
+        # another TransactionTestCase may have flushed the counter rows the migration created
+        counters.reconcile()
+        out = StringIO()
+        call_command('stress_reservations', copies=20, readers=40, workers=8, stdout=out)
+        self.assertIn('20 of 40 readers got one of 20 copies', out.getvalue())
+        self.assertIn('No double allocation.', out.getvalue())
+        self.assertEqual(counters.reconcile_book_copies(), 0)
+        stored = dict(DashboardCounter.objects.values_list('name', 'value'))
+        self.assertEqual(stored, counters.count_totals())
+
+
+class OverdueSweepTests(TestCase):
+    def test_sweep_charges_once_per_day_and_marks_lost(self):
+        reader = User.objects.create_user('late')
+        author, (book,) = create_catalog(1, 0, 0)
+        today = date.today()
+        for days in (1, 3, 40):
+            BookInstance.objects.create(book=book, reader=reader, status=2, due_back=today - timedelta(days=days))
+        BookInstance.objects.create(book=book, reader=reader, status=2, due_back=today)
+        result = sweep_overdue(today=today, batch_size=2, fee_per_day=Decimal('0.50'), lost_after=30)
+        self.assertEqual((result['overdue'], result['batches'], result['marked_unavailable']), (3, 2, 1))
+        self.assertEqual(result['fees'], Decimal('22.00'))
+        self.assertEqual(sweep_overdue(today=today, fee_per_day=Decimal('0.50'))['charged'], 0)
+        self.assertEqual(
+            sorted(BookInstance.objects.values_list('late_fee', flat=True)),
+            [Decimal('0'), Decimal('0.50'), Decimal('1.50'), Decimal('20.00')],
+        )
+        self.assertEqual(counters.reconcile_book_copies(), 0)
+
+    def test_copy_returned_during_the_sweep_is_not_marked_lost(self):
+        author, (book,) = create_catalog(1, 0, 0)
+        today = date.today()
+        copy = BookInstance.objects.create(book=book, reader=User.objects.create_user('late'), status=2,
+                                           due_back=today - timedelta(days=40))
+
+        class ReturnedMeanwhile:
+            def atomic(self):
+                copy.status, copy.reader, copy.due_back = 0, None, None
+                copy.save()
+                return transaction.atomic()
+
+        with mock.patch('library.jobs.transaction', ReturnedMeanwhile()):
+            result = sweep_overdue(today=today, lost_after=30)
+        self.assertEqual((result['marked_unavailable'], result['charged'], result['fees']), (0, 0, 0))
+        copy.refresh_from_db()
+        self.assertEqual(copy.late_fee, 0)
+        self.assertEqual(counters.reconcile_book_copies(), 0)
+
+    def test_copy_charged_by_a_concurrent_sweep_is_not_charged_again(self):
+        author, (book,) = create_catalog(1, 0, 0)
+        today = date.today()
+        copy = BookInstance.objects.create(book=book, reader=User.objects.create_user('late'), status=2,
+                                           due_back=today - timedelta(days=3))
+
+        class ChargedMeanwhile:
+            def atomic(self):
+                BookInstance.objects.filter(pk=copy.pk).update(late_fee=Decimal('0.30'), fees_accrued_until=today)
+                return transaction.atomic()
+
+        with mock.patch('library.jobs.transaction', ChargedMeanwhile()):
+            result = sweep_overdue(today=today, fee_per_day=Decimal('0.10'))
+        self.assertEqual((result['overdue'], result['charged'], result['fees']), (1, 0, 0))
+        copy.refresh_from_db()
+        self.assertEqual(copy.late_fee, Decimal('0.30'))
+
+
+class ImportCatalogTests(TestCase):
+    CSV = (
+        "title,summary,author_first_name,author_last_name,genres,copies\n"
+        "Anykščių šilelis,<p>Poema</p>,Antanas,Baranauskas,Poezija;Klasika,2\n"
+        "Metai,<p>Poema</p>,Kristijonas,Donelaitis,Poezija,3\n"
+        "Metai,<p>Keturių dalių poema</p>,Kristijonas,Donelaitis,Poezija,4\n"
+    )
+
+    def test_import_is_idempotent_and_resumable(self):
+        cache.clear()
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'catalog.csv'
+            path.write_text(self.CSV, encoding='utf-8')
+            checkpoint = Path(directory) / 'catalog.checkpoint'
+            call_command('import_catalog', path, batch_size=2, checkpoint=checkpoint, stdout=StringIO())
+            self.assertEqual(json.loads(checkpoint.read_text())['rows'], 3)
+            out = StringIO()
+            call_command('import_catalog', path, batch_size=2, checkpoint=checkpoint, stdout=out)
+            self.assertIn('Resuming after 3 rows.', out.getvalue())
+            call_command('import_catalog', path, batch_size=1, stdout=StringIO())
+        metai = Book.objects.get(title='Metai')
+        self.assertEqual((metai.available_count, metai.instances.count()), (4, 4))
+        self.assertEqual(metai.genre.count(), 1)
+        self.assertIn('keturiu daliu poema', metai.search_document)
+        self.assertEqual(Author.objects.get(last_name='Baranauskas').search_name, 'antanas baranauskas')
+        self.assertEqual(counters.reconcile_book_copies(), 0)
+        self.assertEqual(counters.get_counters(), counters.count_totals())
+
+
+class BookSearchTests(TestCase):
+    def setUp(self):
+        donelaitis = Author.objects.create(first_name='Kristijonas', last_name='Donelaitis')
+        baranauskas = Author.objects.create(first_name='Antanas', last_name='Baranauskas')
+        self.metai = Book.objects.create(title='Metai', summary='<p>Pavasario linksmybės</p>', author=donelaitis)
+        self.silelis = Book.objects.create(title='Anykščių šilelis', summary='Poema', author=baranauskas)
+        self.about = Book.objects.create(title='Apie poemas', summary='Apie Anykščių šilelį ir šilelio medžius', author=baranauskas)
+
+    def titles(self, query):
+        return [book.title for book in search_books(Book.objects.all(), query)]
+
+    def test_matches_all_terms_without_diacritics(self):
+        self.assertEqual(self.titles('pavasario LINKSMYBES'), ['Metai'])
+        self.assertEqual(self.titles('donelaitis metai'), ['Metai'])
+        self.assertEqual(self.titles('donelaitis šilelis'), [])
+
+    def test_title_matches_come_first(self):
+        self.assertEqual(self.titles('šilelis')[0], 'Anykščių šilelis')
+
+    def test_blank_query_keeps_the_queryset(self):
+        queryset = Book.objects.order_by('-title')
+        self.assertIs(search_books(queryset, ' <p></p> '), queryset)
+
+    @skipUnless(connection.vendor == 'postgresql', 'full text search needs Postgres')
+    def test_ranks_by_full_text_relevance(self):
+        Book.objects.create(title='Kitos', summary='šilelis', author=self.metai.author)
+        Book.objects.create(title='Zuikis', summary='šilelis, šilelis ir dar kartą šilelis', author=self.metai.author)
+        results = list(search_books(Book.objects.all(), 'šilelis'))
+        self.assertEqual([book.title for book in results], ['Anykščių šilelis', 'Zuikis', 'Kitos'])
+        self.assertGreater(results[1].search_rank, results[2].search_rank)
+        self.assertIn("to_tsvector('simple'::regconfig", str(search_books(Book.objects.all(), 'šilelis').query))
+
+
+class AuthorSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for first_name, last_name in [('Jonas', 'Biliūnas'), ('Kazys', 'Binkis'), ('Albinas', 'Aukštaitis'),
+                                      ('Salomėja', 'Nėris')]:
+            Author.objects.create(first_name=first_name, last_name=last_name)
+
+    def last_names(self, query):
+        return [author.last_name for author in search_authors(Author.objects.all(), query)]
+
+    def test_name_prefixes_come_first(self):
+        self.assertEqual(self.last_names('BI'), ['Biliūnas', 'Binkis', 'Aukštaitis'])
+        self.assertEqual(self.last_names('salomeja neris'), ['Nėris'])
+
+    @skipUnless(connection.vendor != 'postgresql', 'Postgres may match similar spellings')
+    def test_without_trigrams_only_substrings_match(self):
+        self.assertEqual(self.last_names('bilunas'), [])
+
+    @skipUnless(connection.vendor == 'postgresql', 'trigram matching needs Postgres')
+    def test_similar_spellings_match_with_trigrams(self):
+        if not trigram_available(connection.alias):
+            self.skipTest('pg_trgm is not installed')
+        authors = list(search_authors(Author.objects.all(), 'jonas bilunas'))
+        self.assertEqual(authors[0].last_name, 'Biliūnas')
+        self.assertGreater(authors[0].similarity, 0.3)
+
+    def test_trigram_check_expires(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch('library.search.trigram_installed', return_value=True) as installed:
+            self.assertTrue(trigram_available(connection.alias))
+            self.assertTrue(trigram_available(connection.alias))
+            self.assertEqual(installed.call_count, 1)
+            cache.clear()
+            with mock.patch('library.search.TRIGRAM_CHECK_SECONDS', 0):
+                trigram_available(connection.alias)
+                trigram_available(connection.alias)
+            self.assertEqual(installed.call_count, 3)
+
+
+class ExportTests(TestCase):
+    def test_staff_streams_gzipped_jsonl(self):
+        create_catalog(3, 2, 0)
+        url = reverse('export', kwargs={'dataset': 'books', 'format': 'jsonl'})
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(url, {'gzip': 1})
+        self.assertTrue(response.streaming)
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)['title'] for line in lines],
+            ['Book 000', 'Book 001', 'Book 002'],
+        )
+        self.assertEqual(json.loads(lines[0])['genres'], 'Genre 0;Genre 1;Genre 2')
+
+    def test_copies_csv(self):
+        create_catalog(1, 3, 0)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(reverse('export', kwargs={'dataset': 'copies', 'format': 'csv'}))
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'book_id', 'book_title'])
+        self.assertEqual(len(rows), 4)
+
+
+class ApiTests(TestCase):
+    def test_cursor_pagination_and_sparse_fields(self):
+        create_catalog(5, 1, 0)
+        url = reverse('api_list', kwargs={'resource': 'books'})
+        titles = []
+        while url:
+            data = self.client.get(url, {'fields': 'title', 'limit': 2} if '?' not in url else None).json()
+            titles.extend(book['title'] for book in data['results'])
+            self.assertEqual({key for book in data['results'] for key in book}, {'title'})
+            url = data['next']
+        self.assertEqual(titles, [f"Book {i:03}" for i in range(5)])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('api_list', kwargs={'resource': 'authors'}), {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CoverVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        settings_override = override_settings(MEDIA_ROOT=media.name, IMAGE_VARIANTS_WORKER=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, size=(800, 1200)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'navy').save(buffer, 'PNG')
+        return SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+
+    def test_variants_follow_cover_changes(self):
+        author = Author.objects.create(first_name='Vaižgantas', last_name='Tumas')
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='Dėdės ir dėdienės', summary='', author=author, cover=self.upload())
+        variant_queue.drain()
+        book.refresh_from_db()
+        self.assertEqual(book.cover_sizes, [[160, 240], [320, 480], [640, 960]])
+        first_cover = book.cover.name
+        for extension in ('jpg', 'webp'):
+            self.assertTrue((self.media_root / variant_name(first_cover, 640, extension)).exists())
+
+        response = self.client.get(reverse('book_detail', kwargs={'pk': book.pk}))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'width="320" height="480"')
+
+        book = Book.objects.get(pk=book.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            book.cover = self.upload(size=(100, 150))
+            book.save()
+        variant_queue.drain()
+        book.refresh_from_db()
+        self.assertEqual(book.cover_sizes, [[100, 150]])
+        self.assertFalse((self.media_root / variant_name(first_cover, 640, 'jpg')).exists())
+
+
+
+class CoverVariantCommandTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_process_pool_backfills_variants(self):
+        author = Author.objects.create(first_name='Vaižgantas', last_name='Tumas')
+        for i, size in enumerate([(100, 150), (800, 1200), (400, 600)]):
+            buffer = BytesIO()
+            Image.new('RGB', size, 'navy').save(buffer, 'PNG')
+            name = FileSystemStorage(location=self.media_root).save(f'library/book_covers/cover{i}.png', BytesIO(buffer.getvalue()))
+            # a queryset update skips the signals, as for covers uploaded before variants existed
+            Book.objects.filter(pk=Book.objects.create(title=f'Knyga {i}', summary='', author=author).pk).update(cover=name)
+        out = StringIO()
+        call_command('generate_cover_variants', workers=2, stdout=out)
+        self.assertIn('covers: 3, failed: 0', out.getvalue())
+        self.assertEqual(
+            [len(sizes) for sizes in Book.objects.order_by('title').values_list('cover_sizes', flat=True)],
+            [1, 3, 2],
+        )
+        self.assertTrue((self.media_root / variant_name('library/book_covers/cover1.png', 640, 'webp')).exists())
@@ -1,14 +1,37 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
+
+if getattr(settings, 'LIBRARY_ASYNC_VIEWS', False):
+    from . import async_views
+    catalog_views = {
+        'index': async_views.index,
+        'author_list': async_views.author_list,
+        'author_detail': async_views.author_detail,
+        'book_list': async_views.book_list,
+        'book_detail': async_views.book_detail,
+    }
+else:
+    catalog_views = {
+        'index': views.index,
+        'author_list': views.author_list,
+        'author_detail': views.author_detail,
+        'book_list': views.BookListView.as_view(),
+        'book_detail': views.BookDetailView.as_view(),
+    }
 
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('authors/', views.author_list, name='author_list'),
-    path('author/<int:pk>/', views.author_detail, name='author_detail'),
-    path('books/', views.BookListView.as_view(), name='book_list'),
-    path('book/<int:pk>/', views.BookDetailView.as_view(), name='book_detail'),
+    path('', catalog_views['index'], name='index'),
+    path('authors/', catalog_views['author_list'], name='author_list'),
+    path('author/<int:pk>/', catalog_views['author_detail'], name='author_detail'),
+    path('books/', catalog_views['book_list'], name='book_list'),
+    path('book/<int:pk>/', catalog_views['book_detail'], name='book_detail'),
+    path('book/<int:pk>/reviews/', views.book_reviews, name='book_reviews'),
     path('books/my/', views.UserBookInstanceListView.as_view(), name='user_book_instances'),
     path('book/reserve/', views.BookInstanceCreateView.as_view(), name='bookinstance_create'),
     path('book/take/<uuid:pk>/', views.BookInstanceUpdateView.as_view(), name='bookinstance_update'),
-    path('book/return/<uuid:pk>/', views.BookInstanceDeleteView.as_view(), name='bookinstance_delete'),
+    path('book/return/<uuid:pk>/', views.BookInstanceReturnView.as_view(), name='bookinstance_return'),
+    path('export/<slug:dataset>.<slug:format>', views.export, name='export'),
+    path('api/v1/<slug:resource>/', api.resource_list, name='api_list'),
+    path('api/v1/<slug:resource>/<str:pk>/', api.resource_detail, name='api_detail'),
 ]
@@ -1,94 +1,177 @@
 from typing import Any, Dict, Optional
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
 from django.core.paginator import Paginator
 from datetime import date, timedelta
+from django.db.models import Prefetch
 from django.db.models.query import QuerySet
-from django.db.models import Q
-from django.http import HttpResponse
-from django.shortcuts import render, get_object_or_404
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render, get_object_or_404
 from django.urls import reverse, reverse_lazy
 from django.utils.translation import gettext_lazy as _
 from django.views import generic
+from django.views.decorators.http import require_GET
+from ptu12_library.db_router import PrimaryDatabaseMixin
+from . import counters, exports, visits
+from . api import review_data
 from . forms import BookReviewForm, BookInstanceForm
-from . models import Book, Author, BookInstance, Genre
+from . models import Book, Author, BookInstance, BookReview, Genre
+from . pagination import KeysetPaginationMixin, KeysetPaginator, keyset_count_mode, keyset_enabled
+from . reservations import NoCopyAvailable, reserve_copy
+from . search import search_authors, search_books
+from . templatetags.library_tags import querystring
+
+REVIEWS_PER_PAGE = 10
 
 def index(request):
-    # Suskaičiuokime keletą pagrindinių objektų
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
-    
-    # Laisvos knygos (tos, kurios turi statusą 'g')
-    num_instances_available = BookInstance.objects.filter(status__exact=0).count()
-    
-    # Kiek yra autorių    
-    num_authors = Author.objects.count()
+    # Pagrindinių objektų skaičiai saugomi skaitliukuose, o ne skaičiuojami kiekvieną kartą
+    counts = counters.get_counters()
 
-    # Apsilankymų skaitliukas
-    num_visits = request.session.get('num_visits', 1)
-    request.session['num_visits'] = num_visits + 1
+    # Apsilankymų skaitliukas laikomas pasirašytame slapuke, ne sesijoje: skaitymas nerašo į DB
+    num_visits = visits.read_visits(request)
     
     # perduodame informaciją į šabloną žodyno pavidale:
     context = {
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
-        'num_authors': num_authors,
+        'num_books': counts['books'],
+        'num_instances': counts['instances'],
+        'num_instances_available': counts['instances_available'],
+        'num_authors': counts['authors'],
         'num_visits': num_visits,
     }
 
-    return render(request, 'library/index.html', context)
+    response = render(request, 'library/index.html', context)
+    visits.remember_visits(response, num_visits + 1)
+    return response
+
+@staff_member_required
+def export(request, dataset: str, format: str):
+    if dataset not in exports.DATASETS or format not in exports.FORMATS:
+        raise Http404
+    compress = bool(request.GET.get('gzip'))
+    response = StreamingHttpResponse(
+        exports.export_stream(dataset, format, compress),
+        content_type='application/gzip' if compress else exports.FORMATS[format],
+    )
+    filename = exports.export_filename(dataset, format, compress)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 def author_list(request):
-    qs = Author.objects
+    qs = Author.objects.all()
     query = request.GET.get('query')
     if query:
-        qs = qs.filter(
-            Q(last_name__istartswith=query) |
-            Q(first_name__icontains=query)
-        )
+        qs = search_authors(qs, query)
+    if keyset_enabled(request) and not query:
+        paginator = KeysetPaginator(qs, 5, count=keyset_count_mode())
+        author_list = paginator.get_page(request.GET.get('cursor'))
     else:
-        qs = qs.all()
-    paginator = Paginator(qs, 5)
-    author_list = paginator.get_page(request.GET.get('page'))
+        paginator = Paginator(qs, 5)
+        author_list = paginator.get_page(request.GET.get('page'))
     return render(request, 'library/authors.html', {
         'author_list': author_list,
     })
 
+def author_detail_queryset() -> QuerySet[Author]:
+    return Author.objects.prefetch_related(
+        Prefetch('books', queryset=Book.objects.only('id', 'title', 'author_id'))
+    )
+
 def author_detail(request, pk: int):
     return render(request, 'library/author_detail.html', {
-        'author': get_object_or_404(Author, pk=pk)
+        'author': get_object_or_404(author_detail_queryset(), pk=pk)
     })
 
+def book_list_queryset(params) -> QuerySet[Book]:
+    qs = Book.objects.select_related('author').defer('summary', 'search_document')
+    if params.get('available'):
+        # served by the partial library_book_available_title index
+        qs = qs.filter(available_count__gt=0)
+    query = params.get('query')
+    if query:
+        qs = search_books(qs, query)
+    return qs
+
+def book_detail_queryset() -> QuerySet[Book]:
+    # the copies are read by the template only when its cached fragment is missing
+    return Book.objects.select_related('author').defer(
+        'search_document',
+    ).prefetch_related(
+        'genre',
+    )
+
+def is_ajax(request) -> bool:
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
 
-class BookListView(generic.ListView):
+def review_page_context(request, book_id: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """One page of a book's reviews, newest first, and the URL of the next one."""
+    paginator = KeysetPaginator(
+        BookReview.objects.filter(book_id=book_id).select_related('reviewer__profile'),
+        REVIEWS_PER_PAGE,
+    )
+    page = paginator.get_page(cursor)
+    next_url = None
+    if page.has_next():
+        next_url = reverse('book_reviews', kwargs={'pk': book_id}) + querystring(
+            {'request': request}, cursor=page.next_cursor)
+    return {'reviews': page, 'reviews_next_url': next_url}
+
+@require_GET
+def book_reviews(request, pk: int):
+    if not Book.objects.filter(pk=pk).exists():
+        raise Http404
+    context = review_page_context(request, pk, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        next_url = context['reviews_next_url']
+        return JsonResponse({
+            'results': [review_data(review) for review in context['reviews']],
+            'next': request.build_absolute_uri(next_url) if next_url else None,
+        })
+    return render(request, 'includes/review_list.html', context)
+
+
+class CachedObjectMixin:
+    """Fetches the view's object once per request, however often it is asked for."""
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_cached_object'):
+            self._cached_object = super().get_object()
+        return self._cached_object
+
+
+class BookListView(KeysetPaginationMixin, generic.ListView):
     model = Book
     paginate_by = 6
     template_name = 'library/book_list.html'
 
+    def keyset_applicable(self, queryset: QuerySet) -> bool:
+        # ranked search results are short, they keep OFFSET pagination
+        return super().keyset_applicable(queryset) and not self.request.GET.get('query')
+
     def get_queryset(self) -> QuerySet[Any]:
-        qs = super().get_queryset()
-        query = self.request.GET.get('query')
-        if query:
-            qs = qs.filter(
-                Q(title__icontains=query) |
-                Q(summary__icontains=query) |
-                Q(author__last_name__istartswith=query)
-            )
-        return qs
+        return book_list_queryset(self.request.GET)
 
 
-class BookDetailView(generic.edit.FormMixin, generic.DetailView):
+class BookDetailView(CachedObjectMixin, generic.edit.FormMixin, generic.DetailView):
     model = Book
     template_name = 'library/book_detail.html'
     form_class = BookReviewForm
 
+    def get_queryset(self) -> QuerySet[Any]:
+        return book_detail_queryset()
+
     def get_initial(self) -> Dict[str, Any]:
         initial = super().get_initial()
         initial['book'] = self.get_object()
         initial['reviewer'] = self.request.user
         return initial
 
+    def get_context_data(self, **kwargs) -> Dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context.update(review_page_context(self.request, self.object.pk))
+        return context
+
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
         form = self.get_form()
@@ -100,26 +183,34 @@ class BookDetailView(generic.edit.FormMixin, generic.DetailView):
     def form_valid(self, form: Any) -> HttpResponse:
         form.instance.book = self.get_object()
         form.instance.reviewer = self.request.user
-        form.save()
+        review = form.save()
+        if is_ajax(self.request):
+            # the page prepends the new review itself, nothing to re-render
+            return render(self.request, 'includes/review.html', {'review': review}, status=201)
         messages.success(self.request, _('Review posted!'))
         return super().form_valid(form)
 
+    def form_invalid(self, form: Any) -> HttpResponse:
+        if is_ajax(self.request):
+            return JsonResponse({'errors': form.errors}, status=400)
+        return super().form_invalid(form)
+
     def get_success_url(self) -> str:
         return reverse('book_detail', kwargs={'pk':self.get_object().pk})
 
 
-class UserBookInstanceListView(LoginRequiredMixin, generic.ListView):
+class UserBookInstanceListView(PrimaryDatabaseMixin, LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = BookInstance
     template_name = 'library/user_bookinstance_list.html'
     paginate_by = 10
 
     def get_queryset(self) -> QuerySet[Any]:
-        qs = super().get_queryset()
+        qs = super().get_queryset().select_related('book')
         qs = qs.filter(reader=self.request.user)
         return qs
 
 
-class BookInstanceCreateView(LoginRequiredMixin, generic.CreateView):
+class BookInstanceCreateView(PrimaryDatabaseMixin, LoginRequiredMixin, generic.CreateView):
     model = BookInstance
     form_class = BookInstanceForm
     template_name = 'library/bookinstance_form.html'
@@ -140,15 +231,20 @@ class BookInstanceCreateView(LoginRequiredMixin, generic.CreateView):
         return initial
 
     def form_valid(self, form):
-        form.instance.book = self.book
-        form.instance.reader = self.request.user
-        form.instance.status = 1
-        return super().form_valid(form)
+        try:
+            self.object = reserve_copy(self.book, self.request.user, form.cleaned_data['due_back'])
+        except NoCopyAvailable:
+            messages.error(self.request, _('Sorry, there are no available copies of this book right now.'))
+            return redirect(self.book)
+        messages.success(self.request, _('Book is reserved.'))
+        return HttpResponseRedirect(self.get_success_url())
 
 
 class BookInstanceUpdateView(
+    PrimaryDatabaseMixin,
     LoginRequiredMixin, 
     UserPassesTestMixin, 
+    CachedObjectMixin,
     generic.UpdateView
 ):
     model = BookInstance
@@ -156,6 +252,9 @@ class BookInstanceUpdateView(
     template_name = 'library/bookinstance_form.html'
     success_url = reverse_lazy('user_book_instances')
 
+    def get_queryset(self) -> QuerySet[Any]:
+        return super().get_queryset().select_related('book__author')
+
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         context = super().get_context_data(**kwargs)
         obj = self.get_object()
@@ -183,18 +282,26 @@ class BookInstanceUpdateView(
         return obj.reader == self.request.user
 
 
-class BookInstanceDeleteView(
+class BookInstanceReturnView(
+    PrimaryDatabaseMixin,
     LoginRequiredMixin,
     UserPassesTestMixin,
-    generic.DeleteView
+    CachedObjectMixin,
+    generic.UpdateView
 ):
+    """Puts the reader's copy back on the shelf, where the next reservation can claim it."""
     model = BookInstance
-    template_name = 'library/user_bookinstance_delete.html'
+    fields = []
+    template_name = 'library/user_bookinstance_return.html'
     success_url = reverse_lazy('user_book_instances')
 
+    def get_queryset(self) -> QuerySet[Any]:
+        return super().get_queryset().select_related('book__author')
+
     def form_valid(self, form):
+        self.object.mark_returned()
         messages.success(self.request, _('Book is now returned.'))
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
 
     def test_func(self) -> bool | None:
         obj = self.get_object()
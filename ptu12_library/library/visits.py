@@ -0,0 +1,22 @@
+from django.core import signing
+
+COOKIE_NAME = 'num_visits'
+COOKIE_SALT = 'library.visits'
+COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def read_visits(request) -> int:
+    """The visitor's count from the signed cookie, or from the session it used to live in.
+
+    Reading never creates a session, so anonymous visitors cost no session row.
+    """
+    try:
+        return int(request.get_signed_cookie(COOKIE_NAME, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE))
+    except (KeyError, ValueError, signing.BadSignature):
+        return request.session.get('num_visits', 1)
+
+
+def remember_visits(response, num_visits: int) -> None:
+    response.set_signed_cookie(
+        COOKIE_NAME, str(num_visits), salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+    )
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ptu12_library.settings')
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', '1')
+# async views run queries on changing threads, persistent connections would pile up; use a pooler instead
+os.environ.setdefault('DJANGO_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,121 @@
+import random
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+# apps whose reads may be served by a replica; users, sessions and profiles always read the primary
+REPLICA_APPS = {'library'}
+STICKY_COOKIE = 'use_primary'
+
+_primary_pinned = ContextVar('primary_pinned', default=False)
+
+
+@contextmanager
+def use_primary():
+    """Routes every read inside the block, or the decorated view, to the primary."""
+    token = _primary_pinned.set(True)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(token)
+
+
+def install_wrapper(stack: ExitStack, wrapper) -> None:
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(wrapper))
+
+
+@contextmanager
+def wrap_queries(wrapper):
+    """Runs every query of the current thread on any database alias through `wrapper`.
+
+    The wrapper should find its request through a ContextVar: requests that
+    share a thread share its connections, and these wrappers with them.
+    """
+    with ExitStack() as stack:
+        install_wrapper(stack, wrapper)
+        yield
+
+
+@asynccontextmanager
+async def awrap_queries(wrapper):
+    """wrap_queries() for async middleware: the ORM runs in the request's sync thread, not the event loop's."""
+    stack = ExitStack()
+    await sync_to_async(install_wrapper)(stack, wrapper)
+    try:
+        yield
+    finally:
+        await sync_to_async(stack.close)()
+
+
+class PrimaryDatabaseMixin:
+    """View mixin reading from the primary for the whole request, for pages showing the user's own writes."""
+    def dispatch(self, request, *args, **kwargs):
+        with use_primary():
+            return super().dispatch(request, *args, **kwargs)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter:
+    """Catalog reads go to a random replica, unless the primary is pinned or a transaction is open on it."""
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in REPLICA_APPS or not replicas():
+            return DEFAULT_DB_ALIAS
+        if _primary_pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # read-after-write: a replica may not have the change yet
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def pins_primary(request) -> bool:
+    return request.method not in ('GET', 'HEAD', 'OPTIONS') or STICKY_COOKIE in request.COOKIES
+
+
+def remember_write(request, response):
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and replicas():
+        # the user's next requests read their own write from the primary until replicas catch up
+        response.set_cookie(
+            STICKY_COOKIE, '1',
+            max_age=getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 5),
+            httponly=True, samesite='Lax',
+        )
+    return response
+
+
+@sync_and_async_middleware
+def primary_replica_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _primary_pinned.set(pins_primary(request))
+            try:
+                response = await get_response(request)
+            finally:
+                _primary_pinned.reset(token)
+            return remember_write(request, response)
+    else:
+        def middleware(request):
+            token = _primary_pinned.set(pins_primary(request))
+            try:
+                response = get_response(request)
+            finally:
+                _primary_pinned.reset(token)
+            return remember_write(request, response)
+    return middleware
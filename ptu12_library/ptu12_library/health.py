@@ -0,0 +1,47 @@
+import threading
+import time
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+
+_lock = threading.Lock()
+_last_ping = {'checked_at': 0.0, 'ok': False}
+
+
+def ping_database(alias: str = 'default') -> bool:
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        return True
+    except DatabaseError:
+        return False
+
+
+def database_ready() -> bool:
+    """The database ping result, reused for HEALTH_CHECK_CACHE_SECONDS so probes stay cheap."""
+    ttl = getattr(settings, 'HEALTH_CHECK_CACHE_SECONDS', 5)
+    with _lock:
+        if time.monotonic() - _last_ping['checked_at'] >= ttl:
+            _last_ping['ok'] = ping_database()
+            _last_ping['checked_at'] = time.monotonic()
+        return _last_ping['ok']
+
+
+@never_cache
+@require_GET
+def healthz(request):
+    # liveness: the process answers, no dependencies are checked
+    return JsonResponse({'status': 'ok'})
+
+
+@never_cache
+@require_GET
+def readyz(request):
+    ready = database_ready()
+    return JsonResponse(
+        {'status': 'ok' if ready else 'unavailable', 'database': ready},
+        status=200 if ready else 503,
+    )
@@ -0,0 +1,177 @@
+import logging
+import os
+import posixpath
+import queue
+import threading
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_init, post_save
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+
+class VariantQueue:
+    """Variant jobs, run one at a time by a daemon thread of this process, off the request path.
+
+    Jobs still queued when the process exits are lost; their rows keep empty
+    sizes, which is what the backfill commands look for. With
+    IMAGE_VARIANTS_WORKER off (tests) nothing runs until drain() is called.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid: Optional[int] = None
+        self.jobs: queue.Queue = queue.Queue()
+        self.worker: Optional[threading.Thread] = None
+
+    def submit(self, func: Callable, *args: Any) -> None:
+        with self.lock:
+            if self.pid != os.getpid():
+                # a forked worker inherits neither the thread nor a usable queue
+                self.pid = os.getpid()
+                self.jobs = queue.Queue()
+                self.worker = None
+            self.jobs.put((func, args))
+            if self.worker is None and getattr(settings, 'IMAGE_VARIANTS_WORKER', True):
+                self.worker = threading.Thread(target=self.run_forever, name='image-variants', daemon=True)
+                self.worker.start()
+
+    def run(self, func: Callable, args: Tuple) -> None:
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("Image variant job %s%r failed", getattr(func, '__qualname__', func), args)
+
+    def run_forever(self) -> None:
+        while True:
+            func, args = self.jobs.get()
+            # the thread's own connections, dropped like a request's when they expire or break
+            close_old_connections()
+            self.run(func, args)
+
+    def drain(self) -> None:
+        """Runs the queued jobs in the calling thread."""
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            self.run(*job)
+
+
+variant_queue = VariantQueue()
+
+
+class ImageVariants:
+    """Resized copies of the image in one model field, stored in a folder next to the upload.
+
+    The sizes that were generated are recorded in `sizes_field`, which stays
+    empty until they exist: templates fall back to the upload meanwhile, and
+    the backfill commands look for rows with an image and no sizes.
+    Subclasses pick the sizes and how the image is resized to each.
+    """
+    folder = 'variants'
+    name_template = '{stem}_{size}.{extension}'
+    sizes: Tuple[int, ...] = ()
+    formats: Dict[str, Tuple[str, Dict[str, Any]]] = {
+        'jpg': ('JPEG', {'quality': 85, 'optimize': True}),
+    }
+
+    def __init__(self, model: str, field: str, sizes_field: str):
+        self.model_label, self.field, self.sizes_field = model, field, sizes_field
+        self.initial_attr = f'_initial_{field}'
+
+    def variant_name(self, original: str, size: int, extension: str) -> str:
+        directory, filename = posixpath.split(original)
+        stem = posixpath.splitext(filename)[0]
+        return posixpath.join(directory, self.folder, self.name_template.format(stem=stem, size=size, extension=extension))
+
+    def sizes_for(self, image: Image.Image) -> List[int]:
+        return list(self.sizes)
+
+    def resize(self, image: Image.Image, size: int) -> Image.Image:
+        raise NotImplementedError
+
+    def record(self, size: int, resized: Image.Image) -> Any:
+        """What sizes_field keeps about one generated size."""
+        return size
+
+    def size_of(self, record: Any) -> int:
+        return record
+
+    def generate(self, original: str, storage=default_storage) -> List[Any]:
+        """Writes every size in every format and returns their records.
+
+        Only touches the storage, so it can run in a worker process without
+        a database connection.
+        """
+        with storage.open(original, 'rb') as f:
+            image = ImageOps.exif_transpose(Image.open(f)).convert('RGB')
+        records = []
+        for size in self.sizes_for(image):
+            resized = self.resize(image, size)
+            for extension, (format, params) in self.formats.items():
+                buffer = BytesIO()
+                resized.save(buffer, format, **params)
+                name = self.variant_name(original, size, extension)
+                # regenerating overwrites, storage.save() would pick a new name instead
+                storage.delete(name)
+                storage.save(name, ContentFile(buffer.getvalue()))
+            records.append(self.record(size, resized))
+        return records
+
+    def delete(self, original: str, records: Iterable[Any], storage=default_storage) -> None:
+        for record in records:
+            for extension in self.formats:
+                storage.delete(self.variant_name(original, self.size_of(record), extension))
+
+    def safe_generate(self, original: str) -> Tuple[str, Optional[List[Any]]]:
+        try:
+            return original, self.generate(original)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            logger.warning("Could not generate variants of %s: %s", original, e)
+            return original, None
+
+    def process(self, pk: Any, previous_name: str = '', previous_records: Iterable[Any] = ()) -> None:
+        """Generates the variants of a row's current image and drops the ones of the image it replaced."""
+        manager = apps.get_model(self.model_label)._default_manager
+        instance = manager.filter(pk=pk).only('pk', self.field).first()
+        current = getattr(instance, self.field).name if instance is not None else None
+        if previous_name and previous_records and current != previous_name:
+            self.delete(previous_name, previous_records)
+        if not current:
+            return
+        records = self.safe_generate(current)[1]
+        if records is not None:
+            # a queryset update: no signals, and an image changed in the meantime is left for its own run
+            manager.filter(pk=pk, **{self.field: current}).update(**{self.sizes_field: records})
+
+    def remember(self, sender, instance, **kwargs) -> None:
+        value = instance.__dict__.get(self.field)
+        instance.__dict__[self.initial_attr] = (getattr(value, 'name', value) or '', instance.__dict__.get(self.sizes_field) or [])
+
+    def changed(self, sender, instance, created, raw=False, update_fields=None, **kwargs) -> None:
+        if raw or (update_fields and self.field not in update_fields) or self.field in instance.get_deferred_fields():
+            return
+        # a new row's initial state is what it was constructed with, not what is stored
+        previous, previous_records = ('', []) if created else instance.__dict__[self.initial_attr]
+        current = getattr(instance, self.field).name or ''
+        if current == previous:
+            return
+        instance.__dict__[self.initial_attr] = (current, [])
+        if getattr(instance, self.sizes_field):
+            # the old sizes do not fit the new image; if processing never finishes the backfill command finds the row
+            setattr(instance, self.sizes_field, [])
+            sender._default_manager.filter(pk=instance.pk).update(**{self.sizes_field: []})
+        transaction.on_commit(lambda: variant_queue.submit(self.process, instance.pk, previous, previous_records))
+
+    def connect(self, model) -> None:
+        """Queues the field for processing after commit whenever a save stores a different file in it."""
+        uid = f'{self.model_label}.{self.field}.variants'
+        post_init.connect(self.remember, sender=model, weak=False, dispatch_uid=uid)
+        post_save.connect(self.changed, sender=model, weak=False, dispatch_uid=uid)
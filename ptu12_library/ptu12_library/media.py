@@ -0,0 +1,154 @@
+import mimetypes
+import os
+from fnmatch import fnmatchcase
+import posixpath
+import re
+import stat
+from typing import Optional, Tuple
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+
+def public(request, name: str) -> bool:
+    return True
+
+
+def members(request, name: str) -> bool:
+    return request.user.is_authenticated
+
+
+# Path pattern (`*` spans folders): who may read the files and how long browsers may keep them.
+# The first matching pattern applies; anything not listed here is never served.
+MEDIA_ACCESS = (
+    ('library/book_covers/*', public, 'public, max-age=86400'),
+    # the 16 and 32 px crops shown next to reviews on public book pages
+    ('user_profile/pictures/avatars/*_16.jpg', public, 'public, max-age=86400'),
+    ('user_profile/pictures/avatars/*_32.jpg', public, 'public, max-age=86400'),
+    ('user_profile/pictures/*', members, 'private, max-age=3600'),
+)
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+class FileRange:
+    """File-like object reading `length` bytes from `start`, for FileResponse."""
+    def __init__(self, file, start: int, length: int):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        data = self.file.read(self.remaining if size < 0 else min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """The first and last byte of a single `bytes=` range, or None to send the whole file.
+
+    Multiple or malformed ranges are ignored, which RFC 9110 allows.
+    """
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        if int(last) == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def file_etag(file_stat: os.stat_result) -> str:
+    # the same format nginx uses, so revalidating a file nginx sent still gets a 304
+    return '"%x-%x"' % (int(file_stat.st_mtime), file_stat.st_size)
+
+
+def accel_response(name: str, content_type: str) -> HttpResponse:
+    response = HttpResponse(content_type=content_type)
+    response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + quote(name)
+    return response
+
+
+def file_response(request, path: str, file_stat: os.stat_result, etag: str, content_type: str) -> HttpResponse:
+    header = request.headers.get('Range', '')
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range not in (etag, http_date(file_stat.st_mtime)):
+        # the file changed since the client got the first part
+        header = ''
+    try:
+        byte_range = parse_range(header, file_stat.st_size) if header else None
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % file_stat.st_size
+        return response
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(file, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, file_stat.st_size)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, name: str):
+    """Authorizes a MEDIA_ROOT file and hands it over to nginx with X-Accel-Redirect.
+
+    Without MEDIA_ACCEL_REDIRECT (development, tests) the file is sent by
+    FileResponse, with single byte ranges. ETag and Last-Modified are
+    checked here either way, so a revalidation never reaches the file.
+    """
+    if posixpath.normpath(name) != name or name.startswith(('/', '../')):
+        raise Http404
+    rule = next((rule for rule in MEDIA_ACCESS if fnmatchcase(name, rule[0])), None)
+    if rule is None:
+        raise Http404
+    pattern, allowed, cache_control = rule
+    if not allowed(request, name):
+        raise PermissionDenied
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        file_stat = os.stat(path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404
+
+    etag = file_etag(file_stat)
+    response = get_conditional_response(request, etag=etag, last_modified=int(file_stat.st_mtime))
+    if response is None:
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if getattr(settings, 'MEDIA_ACCEL_REDIRECT', ''):
+            response = accel_response(name, content_type)
+        else:
+            response = file_response(request, path, file_stat, etag, content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(file_stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    if allowed is not public:
+        patch_vary_headers(response, ('Cookie',))
+    return response
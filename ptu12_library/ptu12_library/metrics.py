@@ -0,0 +1,370 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+from . db_router import awrap_queries, wrap_queries
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process development only
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# keys of the endpoint itself, left out of the cache hit ratio
+CACHE_KEY_PREFIX = 'metrics:'
+GAUGES_CACHE_KEY = CACHE_KEY_PREFIX + 'business_gauges'
+ARCHIVE_FILE = 'archive.json'
+
+# name: (type, help)
+METRICS = {
+    'ptu12_http_requests_total': ('counter', 'Requests by resolved URL name, method and status code.'),
+    'ptu12_http_request_duration_seconds': ('histogram', 'Request latency by resolved URL name.'),
+    'ptu12_db_queries_total': ('counter', 'Database queries by resolved URL name.'),
+    'ptu12_cache_requests_total': ('counter', 'Cache lookups by backend and result.'),
+    'ptu12_cache_hit_ratio': ('gauge', 'Cache hits over lookups since the metrics directory was cleared.'),
+    'ptu12_book_copies': ('gauge', 'Book copies by status.'),
+    'ptu12_overdue_loans': ('gauge', 'Taken copies past their due date.'),
+}
+
+_MISSING = object()
+_queries: ContextVar[Optional[List[int]]] = ContextVar('metrics_queries', default=None)
+
+
+def key(name: str, **labels: str) -> str:
+    return json.dumps([name, sorted(labels.items())])
+
+
+class Registry:
+    """This process' counters and histograms, written to its own file in METRICS_DIR.
+
+    Samples are plain dict updates. A background thread rewrites the file
+    every METRICS_FLUSH_SECONDS while there are new samples, and once more
+    when the process exits. /metrics sums the files of all workers, so
+    another worker's numbers can lag by that much.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.pid = os.getpid()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, List[float]] = {}
+        self.dirty = False
+        self.flusher: Optional[threading.Thread] = None
+
+    def check_fork(self) -> None:
+        # a forked worker starts with nothing of the master's samples, and without its thread
+        if self.pid != os.getpid():
+            self.reset()
+
+    def changed(self) -> None:
+        self.dirty = True
+        if self.flusher is None:
+            self.flusher = threading.Thread(target=self.flush_periodically, name='metrics-flush', daemon=True)
+            self.flusher.start()
+            atexit.register(self.flush_if_enabled)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        with self.lock:
+            self.check_fork()
+            metric = key(name, **labels)
+            self.counters[metric] = self.counters.get(metric, 0) + value
+            self.changed()
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        with self.lock:
+            self.check_fork()
+            # per-bucket counts, then +Inf, sum and count
+            values = self.histograms.setdefault(key(name, **labels), [0] * (len(LATENCY_BUCKETS) + 3))
+            bucket = next((index for index, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+            values[bucket] += 1
+            values[-2] += seconds
+            values[-1] += 1
+            self.changed()
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            self.check_fork()
+            self.dirty = False
+            return {'counters': dict(self.counters), 'histograms': {name: list(values) for name, values in self.histograms.items()}}
+
+    def flush(self) -> None:
+        write_json(metrics_dir() / ('worker-%d.json' % os.getpid()), self.snapshot())
+
+    def flush_if_enabled(self) -> None:
+        if self.dirty and self.pid == os.getpid() and getattr(settings, 'METRICS_ENABLED', False):
+            self.flush()
+
+    def flush_periodically(self) -> None:
+        while True:
+            time.sleep(max(getattr(settings, 'METRICS_FLUSH_SECONDS', 1), 0.1))
+            self.flush_if_enabled()
+
+
+registry = Registry()
+
+
+def metrics_dir() -> Path:
+    directory = Path(settings.METRICS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def write_json(path: Path, data: Dict) -> None:
+    temporary = path.with_name(path.name + '.tmp')
+    temporary.write_text(json.dumps(data))
+    # readers see either the old or the new file, never half of one
+    os.replace(temporary, path)
+
+
+def merge(total: Dict, data: Dict) -> Dict:
+    for metric, value in data.get('counters', {}).items():
+        total['counters'][metric] = total['counters'].get(metric, 0) + value
+    for metric, values in data.get('histograms', {}).items():
+        current = total['histograms'].setdefault(metric, [0] * len(values))
+        total['histograms'][metric] = [a + b for a, b in zip(current, values)]
+    return total
+
+
+@contextmanager
+def directory_lock(exclusive: bool, blocking: bool = True):
+    """Yields whether the lock was taken; only /metrics requests in workers take it."""
+    if fcntl is None:
+        yield True
+        return
+    with open(metrics_dir() / 'lock', 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_json(path: Path) -> Dict:
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def mark_process_dead(directory: str, pid: int) -> None:
+    """Keeps an exited worker's counts under a name its pid cannot be reused for.
+
+    Called from gunicorn's child_exit hook, which runs inside the master's
+    SIGCHLD handler, so it only renames, never waits for a lock and takes
+    the directory from gunicorn.conf.py rather than from Django's settings.
+    """
+    directory = Path(directory)
+    try:
+        os.replace(directory / ('worker-%d.json' % pid), directory / ('exited-%d-%d.json' % (pid, time.time_ns())))
+    except FileNotFoundError:
+        pass
+
+
+def compact() -> None:
+    """Folds the files of exited workers into one archive, unless another request is already at it."""
+    with directory_lock(exclusive=True, blocking=False) as locked:
+        exited = sorted(metrics_dir().glob('exited-*.json')) if locked else []
+        if not exited:
+            return
+        archive = metrics_dir() / ARCHIVE_FILE
+        total = merge({'counters': {}, 'histograms': {}}, read_json(archive))
+        for path in exited:
+            merge(total, read_json(path))
+        write_json(archive, total)
+        for path in exited:
+            path.unlink()
+
+
+def collect() -> Dict:
+    """Sums the files of every live worker, of exited ones and their archive.
+
+    The shared lock keeps compaction out, but the master renames the file of
+    an exiting worker without it. A worker file gone since the listing is
+    read under its new name, which the listing cannot contain yet: a partial
+    sum would look like a counter reset.
+    """
+    registry.flush()
+    compact()
+    total = {'counters': {}, 'histograms': {}}
+    with directory_lock(exclusive=False):
+        paths = sorted(metrics_dir().glob('*.json'))
+        for path in paths:
+            try:
+                merge(total, json.loads(path.read_text()))
+            except FileNotFoundError:
+                pid = path.stem[len('worker-'):]
+                for renamed in metrics_dir().glob('exited-%s-*.json' % pid):
+                    if renamed not in paths:
+                        merge(total, read_json(renamed))
+    return total
+
+
+def clear_directory() -> None:
+    """Starts from zero, called by the gunicorn master before it forks workers."""
+    for path in metrics_dir().glob('*.json'):
+        path.unlink()
+
+
+class CountingCacheMixin:
+    """Counts hits and misses of get() for /metrics; selected in CACHES when METRICS_ENABLED is on."""
+    label = ''
+
+    def get(self, key, default=None, version=None):
+        if not settings.METRICS_ENABLED or str(key).startswith(CACHE_KEY_PREFIX):
+            return super().get(key, default, version=version)
+        value = super().get(key, _MISSING, version=version)
+        registry.inc('ptu12_cache_requests_total', backend=self.label, result='miss' if value is _MISSING else 'hit')
+        return default if value is _MISSING else value
+
+
+class CountingLocMemCache(CountingCacheMixin, LocMemCache):
+    label = 'locmem'
+
+
+class CountingRedisCache(CountingCacheMixin, RedisCache):
+    label = 'redis'
+
+
+def business_gauges() -> Dict[str, Dict[Tuple, int]]:
+    gauges = cache.get(GAUGES_CACHE_KEY)
+    if gauges is None:
+        from library import counters
+        gauges = {
+            'ptu12_book_copies': {(('status', status),): total for status, total in counters.copies_by_status().items()},
+            'ptu12_overdue_loans': {(): counters.count_overdue()},
+        }
+        cache.set(GAUGES_CACHE_KEY, gauges, getattr(settings, 'METRICS_GAUGES_CACHE_SECONDS', 30))
+    return gauges
+
+
+def escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def sample(name: str, labels, value: float) -> str:
+    if labels:
+        name += '{%s}' % ','.join('%s="%s"' % (label, escape(text)) for label, text in labels)
+    return '%s %s' % (name, repr(float(value)) if isinstance(value, float) else value)
+
+
+def render(data: Dict, gauges: Dict[str, Dict[Tuple, int]]) -> str:
+    """Prometheus text exposition format 0.0.4."""
+    samples: Dict[str, List[str]] = {name: [] for name in METRICS}
+    for metric, value in sorted(data['counters'].items()):
+        name, labels = json.loads(metric)
+        samples[name].append(sample(name, labels, value))
+    for metric, values in sorted(data['histograms'].items()):
+        name, labels = json.loads(metric)
+        cumulative = 0
+        for bound, count in zip([*LATENCY_BUCKETS, '+Inf'], values):
+            cumulative += count
+            samples[name].append(sample(name + '_bucket', [*labels, ('le', str(bound))], cumulative))
+        samples[name].append(sample(name + '_sum', labels, values[-2]))
+        samples[name].append(sample(name + '_count', labels, values[-1]))
+    hits = {}
+    for metric, value in data['counters'].items():
+        name, labels = json.loads(metric)
+        if name == 'ptu12_cache_requests_total':
+            backend, result = dict(labels)['backend'], dict(labels)['result']
+            hits.setdefault(backend, {'hit': 0, 'miss': 0})[result] += value
+    for backend, counts in sorted(hits.items()):
+        samples['ptu12_cache_hit_ratio'].append(
+            sample('ptu12_cache_hit_ratio', [('backend', backend)], counts['hit'] / (counts['hit'] + counts['miss'])))
+    for name, values in gauges.items():
+        samples[name].extend(sample(name, labels, value) for labels, value in sorted(values.items()))
+
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        if samples[name]:
+            lines += ['# HELP %s %s' % (name, description), '# TYPE %s %s' % (name, kind), *samples[name]]
+    return '\n'.join(lines) + '\n'
+
+
+@never_cache
+@require_GET
+def metrics_view(request):
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        raise Http404
+    gauges = business_gauges()
+    return HttpResponse(render(collect(), gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def count_query(execute, sql, params, many, context):
+    queries = _queries.get()
+    if queries is not None:
+        queries[0] += 1
+    return execute(sql, params, many, context)
+
+
+def record_request(request, response, started: float, queries: int) -> None:
+    duration = time.perf_counter() - started
+    # unresolved paths share one label, so scanners cannot grow the label set
+    match = request.resolver_match
+    url_name = match.view_name if match and match.view_name else 'unmatched'
+    registry.inc('ptu12_http_requests_total', url_name=url_name, method=request.method, status=str(response.status_code))
+    registry.observe('ptu12_http_request_duration_seconds', duration, url_name=url_name)
+    if queries:
+        registry.inc('ptu12_db_queries_total', queries, url_name=url_name)
+
+
+class MetricsMiddleware:
+    """Counts requests, their latency and database queries per resolved URL name.
+
+    Enabled with METRICS_ENABLED, otherwise removed from the chain at startup.
+    Runs in async chains without an adapter.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = [0]
+        token = _queries.set(queries)
+        started = time.perf_counter()
+        try:
+            with wrap_queries(count_query):
+                response = self.get_response(request)
+        finally:
+            _queries.reset(token)
+        record_request(request, response, started, queries[0])
+        return response
+
+    async def __acall__(self, request):
+        queries = [0]
+        token = _queries.set(queries)
+        started = time.perf_counter()
+        try:
+            async with awrap_queries(count_query):
+                response = await self.get_response(request)
+        finally:
+            _queries.reset(token)
+        record_request(request, response, started, queries[0])
+        return response
@@ -0,0 +1,32 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.apps import apps
+from django.db import connections
+
+# database connections a forked worker inherited, kept referenced so they are never finalized
+_inherited = []
+
+
+def init_worker() -> None:
+    """Gives a pool worker a usable Django without touching the parent's database sessions.
+
+    A forked worker shares the parent's sockets, and closing them there would
+    end the parent's session, or its open transaction. The worker drops the
+    inherited connections instead and opens its own if it needs one. A
+    spawned worker starts from scratch and only needs django.setup().
+    """
+    if not apps.ready:
+        django.setup()
+        return
+    for alias in list(connections.settings):
+        if hasattr(connections._connections, alias):
+            _inherited.append(connections[alias])
+            del connections[alias]
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """A process pool for CPU-bound work, forked where the platform allows it so test settings carry over."""
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method),
+                               initializer=init_worker)
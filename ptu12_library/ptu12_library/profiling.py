@@ -0,0 +1,190 @@
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from . db_router import awrap_queries, wrap_queries
+
+TOP_QUERIES = 5
+SQL_MAX_LENGTH = 500
+
+_current: ContextVar[Optional['RequestProfile']] = ContextVar('request_profile', default=None)
+_log_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Timings of one request: SQL on every database alias, template rendering and the view."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started: Optional[float] = None
+        self.total = self.view = self.templates = 0.0
+        self.queries: List[tuple] = []
+        self.render_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context['connection'].alias, sql, time.perf_counter() - started))
+
+    def finish(self) -> None:
+        finished = time.perf_counter()
+        self.total = finished - self.started
+        if self.view_started is not None:
+            self.view = finished - self.view_started
+
+    @property
+    def db_time(self) -> float:
+        return sum(duration for alias, sql, duration in self.queries)
+
+    def repeated_queries(self) -> Dict[str, int]:
+        """SQL run more than once, with any parameters: the shape of an N+1 loop."""
+        counts = Counter(sql for alias, sql, duration in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+    def top_queries(self, limit: int = TOP_QUERIES) -> List[Dict[str, Any]]:
+        grouped = defaultdict(lambda: {'count': 0, 'ms': 0.0})
+        for alias, sql, duration in self.queries:
+            grouped[(alias, sql)]['count'] += 1
+            grouped[(alias, sql)]['ms'] += duration * 1000
+        ranked = sorted(grouped.items(), key=lambda item: item[1]['ms'], reverse=True)[:limit]
+        return [
+            {'database': alias, 'sql': sql[:SQL_MAX_LENGTH], 'count': stats['count'], 'ms': round(stats['ms'], 2)}
+            for (alias, sql), stats in ranked
+        ]
+
+    def server_timing(self) -> str:
+        repeated = sum(self.repeated_queries().values())
+        return ', '.join([
+            'db;dur=%.1f;desc="%d queries, %d repeated"' % (self.db_time * 1000, len(self.queries), repeated),
+            'tpl;dur=%.1f' % (self.templates * 1000),
+            'view;dur=%.1f' % (self.view * 1000),
+            'total;dur=%.1f' % (self.total * 1000),
+        ])
+
+    def as_log_entry(self, request, response) -> Dict[str, Any]:
+        match = request.resolver_match
+        return {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'url_name': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(self.total * 1000, 2),
+            'view_ms': round(self.view * 1000, 2),
+            'template_ms': round(self.templates * 1000, 2),
+            'db_ms': round(self.db_time * 1000, 2),
+            'queries': len(self.queries),
+            'repeated': sum(self.repeated_queries().values()),
+            'top_queries': self.top_queries(),
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.record_query(execute, sql, params, many, context)
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(context, request)
+        # only the outermost render counts, forms and includes render templates inside it
+        profile.render_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.render_depth -= 1
+            if not profile.render_depth:
+                profile.templates += time.perf_counter() - started
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """The Django template engine, timing what it renders; selected in TEMPLATES when REQUEST_PROFILING is on."""
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfiledTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def write_log_entry(entry: Dict[str, Any]) -> None:
+    path = Path(settings.REQUEST_PROFILING_LOG)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(entry, ensure_ascii=False) + '\n'
+    with _log_lock, path.open('a', encoding='utf-8') as log:
+        log.write(line)
+
+
+def read_log_entries(path) -> List[Dict[str, Any]]:
+    with Path(path).open(encoding='utf-8') as log:
+        return [json.loads(line) for line in log if line.strip()]
+
+
+class ProfilingMiddleware:
+    """Adds a Server-Timing header and logs a sample of slow requests with their top queries.
+
+    Enabled with REQUEST_PROFILING; otherwise Django drops it from the
+    middleware chain at startup and requests never pass through it.
+    Runs in async chains without an adapter.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with wrap_queries(record_query):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            async with awrap_queries(record_query):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile: RequestProfile):
+        profile.finish()
+        response['Server-Timing'] = profile.server_timing()
+        if (profile.total * 1000 >= getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 200)
+                and random.random() < getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 1.0)):
+            write_log_entry(profile.as_log_entry(request, response))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is not None:
+            profile.view_started = time.perf_counter()
@@ -10,6 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import sys
+import tempfile
 from pathlib import Path
 from . import local_settings
 
@@ -24,7 +27,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = local_settings.SECRET_KEY
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DJANGO_DEBUG=0 is the production boot profile: cached templates, no debug context
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = ['*']
 
@@ -45,7 +49,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ptu12_library.metrics.MetricsMiddleware',
+    'ptu12_library.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'ptu12_library.db_router.primary_replica_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -73,7 +80,22 @@ TEMPLATES = [
     },
 ]
 
+if not DEBUG:
+    # templates are compiled once per process and never checked for changes again;
+    # gunicorn.conf.py compiles them all before workers accept requests
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'ptu12_library.wsgi.application'
+ASGI_APPLICATION = 'ptu12_library.asgi.application'
+
+# Serve the read-heavy catalog pages from library.async_views (set by asgi.py)
+LIBRARY_ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS') == '1'
 
 
 # Database
@@ -86,14 +108,98 @@ DATABASES = {
     # }
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'HOST': 'postgres',
+        'HOST': os.environ.get('DJANGO_DB_HOST', 'postgres'),
         'NAME': 'ptu12_library',
         'USER': 'ptu12',
         'PASSWORD': local_settings.DATABASE_PASSWORD,
-        'PORT': 5432
+        'PORT': int(os.environ.get('DJANGO_DB_PORT', 5432)),
+        # keep connections open between requests, checking them before reuse (asgi.py sets 0)
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DJANGO_CONN_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DJANGO_DB_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
+# Behind PgBouncer in transaction pooling mode (DJANGO_DB_POOLER=pgbouncer, host and port pointing to it)
+# server-side cursors do not survive between transactions, so .iterator() reads in client-side chunks.
+# Set before the replicas below copy the primary's settings.
+if os.environ.get('DJANGO_DB_POOLER') == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Read replicas: DJANGO_DB_REPLICA_HOSTS=host1,host2 adds replica1, replica2 ... with the primary's
+# settings. Catalog reads go to a replica, writes, transactions and the user's requests for
+# DATABASE_REPLICA_STICKY_SECONDS after a write stay on the primary (see ptu12_library.db_router).
+
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('DJANGO_DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+# manage.py test without replica hosts gets a separate replica1 test database, not a mirror, so the
+# routing tests can tell a replica's rows from the primary's. DATABASE_REPLICAS stays empty, tests opt in.
+if sys.argv[1:2] == ['test'] and not DATABASE_REPLICAS:
+    DATABASES['replica1'] = {**DATABASES['default'], 'TEST': {'NAME': 'test_ptu12_library_replica1'}}
+
+DATABASE_ROUTERS = ['ptu12_library.db_router.PrimaryReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = int(os.environ.get('DJANGO_DB_REPLICA_STICKY_SECONDS', 5))
+
+# /readyz reuses its database ping for this long
+HEALTH_CHECK_CACHE_SECONDS = int(os.environ.get('DJANGO_HEALTH_CHECK_CACHE_SECONDS', 5))
+
+# Server-Timing headers and a sampled log of slow requests, summarized by `manage.py summarize_profiles`.
+# Off by default: the middleware then removes itself at startup.
+REQUEST_PROFILING = os.environ.get('DJANGO_REQUEST_PROFILING') == '1'
+REQUEST_PROFILING_SLOW_MS = int(os.environ.get('DJANGO_REQUEST_PROFILING_SLOW_MS', 200))
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('DJANGO_REQUEST_PROFILING_SAMPLE_RATE', 1.0))
+REQUEST_PROFILING_LOG = os.environ.get('DJANGO_REQUEST_PROFILING_LOG', BASE_DIR.joinpath('logs', 'slow_requests.jsonl'))
+
+if REQUEST_PROFILING:
+    # the same engine, timing the templates it renders
+    TEMPLATES[0]['BACKEND'] = 'ptu12_library.profiling.ProfiledDjangoTemplates'
+
+# Cover and avatar variants are made by a background thread of each process after the upload is committed;
+# with 0 they wait in the queue (tests drain it), either way generate_cover_variants/generate_avatars backfill.
+IMAGE_VARIANTS_WORKER = os.environ.get('DJANGO_IMAGE_VARIANTS_WORKER', '1') == '1'
+
+# Prometheus metrics at /metrics. Every worker writes its samples to its own file in METRICS_DIR,
+# the endpoint sums them; gunicorn.conf.py clears the directory on start and archives exited workers.
+METRICS_ENABLED = os.environ.get('DJANGO_METRICS') == '1'
+METRICS_DIR = os.environ.get('DJANGO_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'ptu12_library_metrics'))
+METRICS_FLUSH_SECONDS = float(os.environ.get('DJANGO_METRICS_FLUSH_SECONDS', 1))
+METRICS_GAUGES_CACHE_SECONDS = int(os.environ.get('DJANGO_METRICS_GAUGES_CACHE_SECONDS', 30))
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Per-process memory unless DJANGO_REDIS_URL points to a shared Redis (needs the redis package)
+
+# With METRICS_ENABLED the same backends count their hits and misses for /metrics.
+
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': ('ptu12_library.metrics.CountingRedisCache' if METRICS_ENABLED
+                        else 'django.core.cache.backends.redis.RedisCache'),
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        }
+    }
+elif METRICS_ENABLED:
+    CACHES = {
+        'default': {
+            'BACKEND': 'ptu12_library.metrics.CountingLocMemCache',
+        }
+    }
+
+
+# Sessions
+# https://docs.djangoproject.com/en/4.2/topics/http/sessions/#configuring-the-session-engine
+# 'django.contrib.sessions.backends.cached_db' reads sessions through the cache,
+# 'django.contrib.sessions.backends.cache' keeps them out of the database (only with a shared cache).
+# Expired database sessions are removed by the clear_expired_sessions command.
+
+SESSION_ENGINE = os.environ.get('DJANGO_SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,8 +242,16 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR.joinpath(STATIC_URL)
+if not DEBUG:
+    # hashed file names cached forever by nginx, with .gz/.br copies written by collectstatic
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'ptu12_library.storage.CompressedManifestStaticFilesStorage'},
+    }
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR.joinpath(MEDIA_URL)
+# media is authorized by ptu12_library.media; behind nginx the bytes are sent from this internal location
+MEDIA_ACCEL_REDIRECT = os.environ.get('DJANGO_MEDIA_ACCEL_REDIRECT', '')
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,56 @@
+import gzip
+from pathlib import Path
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz copies are written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.map', '.svg', '.html', '.txt', '.json', '.xml', '.ico', '.ttf', '.eot'}
+# smaller files gain nothing worth the extra request headers and file lookups
+COMPRESS_MIN_SIZE = 256
+
+
+def compressors():
+    yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed file names plus .gz and .br copies for nginx gzip_static/brotli_static.
+
+    The copies are written once, at collectstatic, both for the hashed
+    names and for the originals TinyMCE loads its plugins and skins by.
+    A copy is kept only when it is actually smaller than the file.
+    """
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.update(path for path in (name, hashed_name) if path)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names):
+            self.compress(name)
+
+    def compress(self, name: str) -> bool:
+        if Path(name).suffix.lower() not in COMPRESSIBLE_EXTENSIONS or not self.exists(name):
+            return False
+        path = Path(self.path(name))
+        data = path.read_bytes()
+        if len(data) < getattr(settings, 'STATICFILES_COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE):
+            return False
+        written = False
+        for suffix, compress in compressors():
+            compressed = compress(data)
+            target = path.with_name(path.name + suffix)
+            if len(compressed) < len(data):
+                target.write_bytes(compressed)
+                written = True
+            elif target.exists():
+                target.unlink()
+        return written
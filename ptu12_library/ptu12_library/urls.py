@@ -18,13 +18,17 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from . import health, media, metrics
 
 urlpatterns = [
+    path('healthz', health.healthz, name='healthz'),
+    path('readyz', health.readyz, name='readyz'),
+    path('metrics', metrics.metrics_view, name='metrics'),
     path('', include('library.urls')),
     path('profile/', include('user_profile.urls')),
     path('tinymce/', include('tinymce.urls')),
     path('i18n/', include('django.conf.urls.i18n')),
     path('accounts/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
-] + (static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) \
-  + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT))
+    path(settings.MEDIA_URL.lstrip('/') + '<path:name>', media.serve_media, name='media'),
+] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -0,0 +1,24 @@
+from PIL import Image, ImageOps
+from ptu12_library.images import ImageVariants
+
+PICTURE_SIZE = 300
+
+
+class AvatarVariants(ImageVariants):
+    """16 and 32 are the 1x and 2x review avatars, square crops; 300 is the profile page picture."""
+    folder = 'avatars'
+    sizes = (16, 32, PICTURE_SIZE)
+
+    def resize(self, image: Image.Image, size: int) -> Image.Image:
+        if size == PICTURE_SIZE:
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            return resized
+        return ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+
+
+avatar_variants = AvatarVariants('user_profile.Profile', 'picture', 'avatar_sizes')
+
+
+def avatar_name(picture_name: str, size: int) -> str:
+    return avatar_variants.variant_name(picture_name, size, 'jpg')
@@ -0,0 +1,48 @@
+import time
+from typing import Any
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measures login throughput and the queries each login runs, using throwaway bench_login_* users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--real-hasher', action='store_true',
+                            help='Keep the configured password hasher; by default a fast one isolates the signal cost.')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        hashers = None if options['real_hasher'] else ['django.contrib.auth.hashers.MD5PasswordHasher']
+        with override_settings(**({'PASSWORD_HASHERS': hashers} if hashers else {})):
+            self.run(options['logins'], options['users'])
+
+    def run(self, logins: int, users: int) -> None:
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        names = [f"bench_login_{i}" for i in range(users)]
+        for name in names:
+            user, created = User.objects.get_or_create(username=name)
+            user.set_password('bench-pass')
+            user.save()
+        client = Client()
+        try:
+            queries = []
+            with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                client.login(username=names[0], password='bench-pass')
+            started = time.perf_counter()
+            for i in range(logins):
+                client.login(username=names[i % users], password='bench-pass')
+            elapsed = time.perf_counter() - started
+        finally:
+            User.objects.filter(username__in=names).delete()
+        self.stdout.write('logins/s: %.1f' % (logins / elapsed))
+        self.stdout.write('queries per login: %d' % len(queries))
+        for sql in queries:
+            self.stdout.write('  %s' % sql[:120])
@@ -1,23 +1,47 @@
-from typing import Any, Optional
-from django.contrib.auth import get_user_model
+import os
+import sys
+import time
+from typing import Any
 from django.core.management.base import BaseCommand, CommandError
-from user_profile.models import Profile
-
-User = get_user_model()
+from ptu12_library.pools import process_pool
+from user_profile.onboarding import create_missing_profiles, onboard_users, read_users
 
 
 class Command(BaseCommand):
+    help = ('Creates missing user profiles in bulk, and with --csv onboards users '
+            '(username, email, first_name, last_name, password columns) with their profiles.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', help='CSV file of users to create, "-" for standard input.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes hashing passwords, 1 hashes in this process.')
+
     def handle(self, *args: Any, **options: Any) -> str | None:
-        users_without_profile = User.objects.filter(profile__isnull=True)
-        created_profile_count = 0
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be at least 1.')
+        started = time.perf_counter()
         try:
-            for user in users_without_profile:
-                profile = Profile(user=user)
-                profile.save()
-                created_profile_count += 1
-        except Exception as e:
+            if options['csv']:
+                stats = self.onboard(options['csv'], options['batch_size'], options['workers'])
+                self.stdout.write('users created: %d, skipped: %d, %.1f users/s' % (
+                    stats['users'], stats['skipped'], stats['users'] / (time.perf_counter() - started),
+                ))
+            created_profile_count = create_missing_profiles(options['batch_size'])
+        except (OSError, ValueError) as e:
             raise CommandError(e)
         else:
             self.stdout.write(
                 self.style.SUCCESS('%d user profiles created.' % created_profile_count)
             )
+
+    def onboard(self, path: str, batch_size: int, workers: int):
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            if workers == 1:
+                return onboard_users(read_users(stream), batch_size)
+            with process_pool(workers) as pool:
+                return onboard_users(read_users(stream), batch_size, pool)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
@@ -0,0 +1,28 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from user_profile.avatars import avatar_variants
+from user_profile.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Generates the avatar sizes of profile pictures that have none yet, e.g. uploaded by a worker that was restarted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate processed pictures too.')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        profiles = Profile.objects.exclude(Q(picture='') | Q(picture__isnull=True))
+        if not options['force']:
+            profiles = profiles.filter(avatar_sizes=[])
+        processed_count = 0
+        try:
+            for pk in profiles.values_list('pk', flat=True).iterator():
+                avatar_variants.process(pk)
+                processed_count += 1
+        except Exception as e:
+            raise CommandError(e)
+        else:
+            self.stdout.write(
+                self.style.SUCCESS('%d profile pictures processed.' % processed_count)
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profile', '0002_alter_profile_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_sizes',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='avatar sizes'),
+        ),
+    ]
@@ -1,8 +1,10 @@
+from typing import Any, Dict, List
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.db import models
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
-from PIL import Image
+from . avatars import PICTURE_SIZE, avatar_name
 
 
 class Profile(models.Model):
@@ -14,6 +16,8 @@ class Profile(models.Model):
         null=True, blank=True,
     )
     picture = models.ImageField(_("picture"), upload_to='user_profile/pictures')
+    # sizes generated by user_profile.avatars, empty until the picture is processed
+    avatar_sizes = models.JSONField(_("avatar sizes"), default=list, blank=True, editable=False)
 
     class Meta:
         verbose_name = _("profile")
@@ -25,11 +29,53 @@ class Profile(models.Model):
     def get_absolute_url(self):
         return reverse("profile_detail", kwargs={"pk": self.pk})
 
-    def save(self, *args, **kwargs) -> None:
-        super().save(*args, **kwargs)
-        if self.picture:
-            pic = Image.open(self.picture.path)
-            if pic.width > 300 or pic.height > 300:
-                new_size = (300, 300)
-                pic.thumbnail(new_size)
-                pic.save(self.picture.path)
+    @classmethod
+    def for_user(cls, user) -> 'Profile':
+        """The user's profile, created on first use for users registered before profiles existed."""
+        try:
+            return user.profile
+        except cls.DoesNotExist:
+            profile = cls.objects.get_or_create(user=user)[0]
+            user.profile = profile
+            return profile
+
+    @staticmethod
+    def comparable(value: Any) -> Any:
+        return getattr(value, 'name', value)
+
+    def loaded_values(self) -> Dict[str, Any]:
+        # deferred fields are left out, reading them would cost a query
+        return {
+            field.attname: self.comparable(self.__dict__[field.attname])
+            for field in self._meta.concrete_fields if field.attname in self.__dict__
+        }
+
+    def changed_fields(self) -> List[str]:
+        """Fields whose value differs from the one loaded from the database."""
+        loaded = getattr(self, '_loaded_values', {})
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in loaded and self.comparable(getattr(self, field.attname)) != loaded[field.attname]
+        ]
+
+    def avatar_url(self, size: int) -> str:
+        if size in self.avatar_sizes:
+            return default_storage.url(avatar_name(self.picture.name, size))
+        return self.picture.url
+
+    @property
+    def has_review_avatars(self) -> bool:
+        # unlike the uploaded picture, the generated review crops are served to anonymous visitors
+        return {16, 32} <= set(self.avatar_sizes)
+
+    @property
+    def avatar_1x_url(self) -> str:
+        return self.avatar_url(16)
+
+    @property
+    def avatar_2x_url(self) -> str:
+        return self.avatar_url(32)
+
+    @property
+    def picture_url(self) -> str:
+        return self.avatar_url(PICTURE_SIZE)
@@ -0,0 +1,91 @@
+import csv
+from concurrent.futures import Executor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from . models import Profile
+
+User = get_user_model()
+
+USER_COLUMNS = ('username', 'email', 'first_name', 'last_name', 'password')
+
+
+def read_users(stream) -> Iterator[Dict[str, str]]:
+    """Yields user rows from a CSV with a header naming some of USER_COLUMNS; a username is required."""
+    reader = csv.DictReader(stream)
+    if 'username' not in (reader.fieldnames or []):
+        raise ValueError("The CSV needs a 'username' column.")
+    for row in reader:
+        row = {column: (row.get(column) or '').strip() for column in USER_COLUMNS}
+        if row['username']:
+            yield row
+
+
+def batches(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def hash_password(password: str) -> str:
+    # a user without a password in the CSV gets an unusable one and resets it by email
+    return make_password(password or None)
+
+
+def onboard_users(rows: Iterable[Dict[str, str]], batch_size: int = 500,
+                  pool: Optional[Executor] = None) -> Dict[str, int]:
+    """Creates users and their profiles, one transaction and two bulk INSERTs per batch.
+
+    Existing usernames and repeated ones in the input are skipped. Passwords
+    are hashed before the transaction opens, across `pool` when given, since
+    hashing is what costs the time.
+    """
+    stats = {'users': 0, 'skipped': 0}
+    seen = set()
+    for batch in batches(rows, batch_size):
+        usernames = {row['username'] for row in batch}
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        new_rows = []
+        for row in batch:
+            if row['username'] in existing or row['username'] in seen:
+                stats['skipped'] += 1
+                continue
+            seen.add(row['username'])
+            new_rows.append(row)
+        passwords = [row['password'] for row in new_rows]
+        hashes = list(pool.map(hash_password, passwords, chunksize=16)) if pool else [
+            hash_password(password) for password in passwords
+        ]
+        with transaction.atomic():
+            # bulk_create skips post_save, so sync_profile does not run; profiles follow in bulk
+            users = User.objects.bulk_create([
+                User(
+                    username=row['username'],
+                    email=row['email'],
+                    first_name=row['first_name'],
+                    last_name=row['last_name'],
+                    password=password_hash,
+                )
+                for row, password_hash in zip(new_rows, hashes)
+            ])
+            user_ids = [user.pk for user in users]
+            if None in user_ids:
+                # backends that cannot return ids from a bulk INSERT
+                user_ids = User.objects.filter(username__in=[user.username for user in users]).values_list('pk', flat=True)
+            Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        stats['users'] += len(users)
+    return stats
+
+
+def create_missing_profiles(batch_size: int = 1000) -> int:
+    """Creates profiles for users registered before profiles existed, reading user ids through a chunked cursor."""
+    user_ids = User.objects.filter(profile__isnull=True).order_by('pk').values_list('pk', flat=True)
+    created_profile_count = 0
+    # .iterator() reads through a server-side cursor on Postgres instead of loading every id
+    for batch in batches(user_ids.iterator(chunk_size=batch_size), batch_size):
+        with transaction.atomic():
+            Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in batch], ignore_conflicts=True)
+        created_profile_count += len(batch)
+    return created_profile_count
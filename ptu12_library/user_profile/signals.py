@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save
 from django.dispatch import receiver
+from . import avatars
 from . models import Profile
 
 
@@ -8,8 +9,37 @@ User = get_user_model()
 
 
 @receiver(post_save, sender=User)
-def sync_profile(sender, instance, created, **kwargs):
+def sync_profile(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
     if created:
-        Profile.objects.create(user=instance)
-    else:
-        instance.profile.save()
+        Profile.objects.get_or_create(user=instance)
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        # every login lands here
+        return
+    if not sender.profile.is_cached(instance):
+        # the profile was never loaded through this user, so nothing on it can have changed
+        return
+    try:
+        profile = instance.profile
+    except Profile.DoesNotExist:
+        return
+    if profile._state.adding:
+        profile.save()
+    elif changed := profile.changed_fields():
+        profile.save(update_fields=changed)
+
+
+@receiver(post_init, sender=Profile)
+def remember_profile_state(sender, instance, **kwargs):
+    instance._loaded_values = instance.loaded_values()
+
+
+avatars.avatar_variants.connect(Profile)
+
+
+@receiver(post_save, sender=Profile)
+def refresh_profile_state(sender, instance, **kwargs):
+    # what was just saved is what the database holds now
+    instance._loaded_values = instance.loaded_values()
@@ -1,3 +1,139 @@
-from django.test import TestCase
+import tempfile
+from io import BytesIO, StringIO
+from pathlib import Path
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from ptu12_library.images import variant_queue
+from . avatars import avatar_name
+from . models import Profile
 
-# Create your tests here.
+User = get_user_model()
+
+
+class AvatarTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        settings_override = override_settings(MEDIA_ROOT=media.name, IMAGE_VARIANTS_WORKER=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, size):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'teal').save(buffer, 'PNG')
+        return SimpleUploadedFile('me.png', buffer.getvalue(), content_type='image/png')
+
+    def test_avatars_are_made_only_when_the_picture_changes(self):
+        user = User.objects.create_user('skaitytojas', password='secret-pass')
+        profile = user.profile
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.picture = self.upload((900, 600))
+            profile.save()
+        variant_queue.drain()
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_sizes, [16, 32, 300])
+        with Image.open(self.media_root / avatar_name(profile.picture.name, 300)) as picture:
+            self.assertEqual(picture.size, (300, 200))
+        with Image.open(self.media_root / avatar_name(profile.picture.name, 32)) as avatar:
+            self.assertEqual(avatar.size, (32, 32))
+        self.assertTrue(profile.avatar_2x_url.endswith('_32.jpg'))
+        self.assertTrue(profile.has_review_avatars)
+
+        # a login saves the user, which must not touch the picture
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.login(username='skaitytojas', password='secret-pass')
+        self.assertEqual(callbacks, [])
+
+    def test_upload_returns_before_the_avatars_are_made(self):
+        user = User.objects.create_user('skaitytojas', password='secret-pass')
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('profile_update'), {
+                'username': 'skaitytojas', 'email': 'skaitytojas@example.com', 'picture': self.upload((400, 400)),
+            })
+        self.assertRedirects(response, reverse('profile'), fetch_redirect_response=False)
+        profile = Profile.objects.get(user=user)
+        self.assertEqual(profile.avatar_sizes, [])
+        self.assertFalse((self.media_root / avatar_name(profile.picture.name, 32)).exists())
+        variant_queue.drain()
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_sizes, [16, 32, 300])
+        self.assertTrue((self.media_root / avatar_name(profile.picture.name, 32)).exists())
+
+    def test_unprocessed_pictures_are_left_for_the_command(self):
+        profile = User.objects.create_user('skaitytojas').profile
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.picture = self.upload((64, 64))
+            profile.save()
+        variant_queue.drain()
+        first_picture = Profile.objects.get(pk=profile.pk).picture.name
+        # the worker is recycled before the after-commit callback runs
+        with self.captureOnCommitCallbacks(execute=False):
+            profile.picture = self.upload((80, 80))
+            profile.save()
+        self.assertEqual(Profile.objects.get(pk=profile.pk).avatar_sizes, [])
+        self.assertTrue(profile.avatar_1x_url.endswith('.png'))
+        # the upload itself is for members only, anonymous review pages wait for the crops
+        self.assertFalse(profile.has_review_avatars)
+        call_command('generate_avatars', stdout=StringIO())
+        profile = Profile.objects.get(pk=profile.pk)
+        self.assertEqual(profile.avatar_sizes, [16, 32, 300])
+        self.assertNotEqual(profile.picture.name, first_picture)
+        self.assertTrue((self.media_root / avatar_name(profile.picture.name, 16)).exists())
+
+
+class ProfileSyncTests(TestCase):
+    def test_login_does_not_touch_the_profile(self):
+        User.objects.create_user('skaitytojas', password='secret-pass')
+        with CaptureQueriesContext(connection) as context:
+            self.client.login(username='skaitytojas', password='secret-pass')
+        self.assertFalse([query for query in context.captured_queries if 'user_profile' in query['sql']])
+
+    def test_profile_is_saved_only_when_changed(self):
+        user = User.objects.create_user('skaitytojas')
+        user = User.objects.get(pk=user.pk)
+        user.profile.avatar_sizes = [16]
+        with CaptureQueriesContext(connection) as context:
+            user.first_name = 'Ona'
+            user.save()
+            user.save()
+        profile_updates = [query for query in context.captured_queries if 'UPDATE "user_profile_profile"' in query['sql']]
+        self.assertEqual(len(profile_updates), 1)
+        self.assertEqual(Profile.objects.get(user=user).avatar_sizes, [16])
+
+    def test_users_without_profile(self):
+        users = [User.objects.create_user(f"senas{i}") for i in range(3)]
+        Profile.objects.all().delete()
+        user = User.objects.get(pk=users[0].pk)
+        user.save()
+        self.assertEqual(Profile.for_user(user).user, user)
+        call_command('create_user_profiles', batch_size=1, stdout=StringIO())
+        self.assertEqual(Profile.objects.count(), 3)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class OnboardingTests(TransactionTestCase):
+    def test_csv_onboarding_creates_users_and_profiles(self):
+        User.objects.create_user('jonas')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('username,email,first_name,last_name,password\n')
+            f.write('jonas,jonas@example.com,Jonas,Jonaitis,secret-pass\n')
+            for i in range(7):
+                f.write(f"mokinys{i},mokinys{i}@example.com,Mokinys,{i},pass-{i}\n")
+            f.write('mokinys0,again@example.com,Mokinys,0,pass-0\n')
+            f.write('be_slaptazodzio,,,,\n')
+        self.addCleanup(Path(f.name).unlink)
+        out = StringIO()
+        call_command('create_user_profiles', csv=f.name, batch_size=3, workers=2, stdout=out)
+        self.assertIn('users created: 8, skipped: 2', out.getvalue())
+        self.assertEqual(Profile.objects.count(), User.objects.count())
+        self.assertTrue(User.objects.get(username='mokinys3').check_password('pass-3'))
+        self.assertFalse(User.objects.get(username='be_slaptazodzio').has_usable_password())
+        self.assertTrue(self.client.login(username='mokinys6', password='pass-6'))
@@ -4,6 +4,7 @@ from django.contrib import messages
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.decorators.csrf import csrf_protect
 from . forms import ProfileUpdateForm, UserUpdateForm
+from . models import Profile
 
 
 User = get_user_model()
@@ -23,7 +24,7 @@ def profile(request, user_id=None):
 def profile_update(request):
     if request.method == "POST":
         user_form = UserUpdateForm(request.POST, instance=request.user)
-        profile_form = ProfileUpdateForm(request.POST, request.FILES, instance=request.user.profile)
+        profile_form = ProfileUpdateForm(request.POST, request.FILES, instance=Profile.for_user(request.user))
         if user_form.is_valid() and profile_form.is_valid():
             user_form.save()
             profile_form.save()
@@ -31,7 +32,7 @@ def profile_update(request):
             return redirect('profile')
     else:
         user_form = UserUpdateForm(instance=request.user)
-        profile_form = ProfileUpdateForm(instance=request.user.profile)
+        profile_form = ProfileUpdateForm(instance=Profile.for_user(request.user))
     return render(request, 'user_profile/profile_update.html', {'user_form': user_form, 'profile_form': profile_form})
 
 
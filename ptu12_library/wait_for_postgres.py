@@ -1,11 +1,14 @@
 import os
 import logging
-from time import time, sleep
+import socket
+from time import monotonic, sleep
 import psycopg2
 
-# tikrinimo dažnumas, pagal nutylėjimą laukiame 30 sekundžių, ir nepavykus po sekundės laukiame iš naujo.
-check_timeout = os.getenv("POSTGRES_CHECK_TIMEOUT", 30)
-check_interval = os.getenv("POSTGRES_CHECK_INTERVAL", 1)
+# tikrinimo trukmė: pagal nutylėjimą laukiame 30 sekundžių. Bandymai kartojami vis rečiau,
+# pradedant nuo 0.1 s ir ne rečiau nei kas POSTGRES_CHECK_INTERVAL sekundžių.
+check_timeout = float(os.getenv("POSTGRES_CHECK_TIMEOUT", 30))
+check_interval = float(os.getenv("POSTGRES_CHECK_INTERVAL", 1))
+first_interval = 0.1
 
 # duomenų bazės konfigūracija - pagal nutylėjimą turėtų sutapti su Django nustatymais.
 config = {
@@ -24,23 +27,52 @@ logger.info(
     f"DB config {config['dbname']} {config['user']} {config['host']} ...")
 
 # įsimename dabartinį laiką
-start_time = time()
+start_time = monotonic()
 
-# prisijungimo į duomenų bazę tikrinimo funkcija
+
+def remaining():
+    return check_timeout - (monotonic() - start_time)
+
+
+def backoff():
+    # 0.1, 0.2, 0.4 ... sekundės, bet ne ilgiau nei check_interval ir nei liko laiko
+    interval = first_interval
+    while remaining() > 0:
+        yield
+        sleep(max(min(interval, check_interval, remaining()), 0))
+        interval *= 2
+
+
+# pigus patikrinimas: ar serveris jau priima TCP prisijungimus
+def port_open(host, port):
+    try:
+        with socket.create_connection((host, int(port)), timeout=max(min(1, remaining()), 0.1)):
+            return True
+    except OSError:
+        return False
+
+
+# tikras prisijungimas tik tada, kai portas atviras: patikrina slaptažodį ir duomenų bazę
 def pg_isready(host, user, password, dbname, port):
-    while time() - start_time < check_timeout:
+    for _ in backoff():
+        if not port_open(host, port):
+            logger.info(f"Postgres port {host}:{port} is not open yet...")
+            continue
         try:
-            conn = psycopg2.connect(**vars())
+            conn = psycopg2.connect(
+                host=host, user=user, password=password, dbname=dbname, port=port,
+                connect_timeout=max(int(remaining()), 1),
+            )
             logger.info("Postgres is ready! ✨ 💅")
             conn.close()
             return True
-        except psycopg2.OperationalError:
-            logger.info(
-                f"Postgres isn't ready. Waiting for {check_interval} sec...")
-            sleep(check_interval)
+        except psycopg2.OperationalError as e:
+            logger.info(f"Postgres isn't ready: {str(e).strip()}")
 
     logger.error(
         f"We could not connect to Postgres within {check_timeout} seconds.")
     return False
 
-pg_isready(**config)
\ No newline at end of file
+
+if __name__ == '__main__':
+    raise SystemExit(0 if pg_isready(**config) else 1)